@@ -1,30 +1,133 @@
-from flask import Flask, request, jsonify
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 
-from server import UniversityTimetableGenerator, CourseType, RoomType
+from server import UniversityTimetableGenerator, CancellationToken, SCHEDULING_ORDERS
+from ingest import load_catalog, load_payload
+from delta import VersionStore, diff_timetables
+from catalogs import TemplateStore
 
 
 app = Flask(__name__)
 CORS(app)
 
-
-def parse_course_type(type_str: str, credit_hours: int) -> CourseType:
-    if type_str:
-        normalized = type_str.strip().upper()
-        if normalized == "LAB":
-            return CourseType.LAB
-        if normalized in ("THEORY", "THEORY_3", "THEORY_3CR"):
-            return CourseType.THEORY_3CR
-        if normalized in ("THEORY_2", "THEORY_2CR"):
-            return CourseType.THEORY_2CR
-
-    # Fallback based on credit hours
-    if credit_hours == 3:
-        return CourseType.THEORY_3CR
-    if credit_hours == 2:
-        return CourseType.THEORY_2CR
-    # default to 3CR theory
-    return CourseType.THEORY_3CR
+# Upper bound on a single solve; a payload may ask for less with timeLimitSeconds
+GENERATION_TIME_LIMIT = float(os.environ.get("GENERATION_TIME_LIMIT", "120"))
+KEEPALIVE_SECONDS = 1.0
+
+# Recently delivered timetables, so clients can ask for changes since their copy
+versions = VersionStore()
+
+# Parsed catalogs that generation requests can reference by templateId
+templates = TemplateStore()
+
+
+def build_timetable_response(generator: UniversityTimetableGenerator,
+                             group_to_program: Dict[Tuple[int, str, str], str]) -> Dict:
+    """Flatten the generator schedule into per-program lists for the frontend"""
+    result = {}
+    for key, classes in generator.schedule.items():
+        day, semester, section = key
+
+        # We may have multiple departments for same semester/section; choose department from each class
+        for scheduled_class in classes:
+            dept_name = scheduled_class.course.department
+            program_name = group_to_program.get((semester, section, dept_name), "Program")
+            program_key = f"{dept_name} - {program_name} - Semester {semester} - Section {section}"
+
+            if program_key not in result:
+                result[program_key] = []
+
+            for slot in scheduled_class.time_slots:
+                if slot.day != day:
+                    continue
+                result[program_key].append({
+                    "time": f"{slot.start_time}-{slot.end_time}",
+                    "day": day.lower(),
+                    "code": scheduled_class.course.code,
+                    "name": scheduled_class.course.name,
+                    "room": slot.room,
+                    "teacher": scheduled_class.course.teacher or "TBA",
+                })
+
+    # Sort each schedule by time then day for consistency
+    def time_key(item):
+        try:
+            hh, mm = item["time"].split("-")[0].split(":")
+            return (int(hh), int(mm), item["day"]) 
+        except Exception:
+            return (0, 0, item.get("day", "monday"))
+
+    for k in result.keys():
+        result[k] = sorted(result[k], key=time_key)
+
+    return result
+
+
+def versioned_body(timetable: Dict, base_version: Optional[str], extra: Dict) -> Dict:
+    """Response body with the timetable's version id
+
+    If the client already has base_version (and it is still remembered), only
+    the sessions added, removed or moved since then are sent instead of the
+    full per-program lists.
+    """
+    base = versions.get(base_version) if base_version else None
+    body = {"version": versions.put(timetable), **extra}
+    if base is None:
+        body["timetable"] = timetable
+    else:
+        body["baseVersion"] = base_version
+        body["delta"] = diff_timetables(base, timetable)
+    return body
+
+
+def parse_time_limit(payload: Dict) -> float:
+    requested = payload.get("timeLimitSeconds")
+    if requested is None:
+        return GENERATION_TIME_LIMIT
+    requested = float(requested)
+    if requested <= 0:
+        raise ValueError("timeLimitSeconds must be positive")
+    return min(requested, GENERATION_TIME_LIMIT)
+
+
+def stream_solve(solve: Callable[[float, CancellationToken], Dict], time_limit: float) -> Response:
+    """Run solve(deadline, token) in a worker thread and stream its JSON result
+
+    While the solve runs a space is written every KEEPALIVE_SECONDS (leading
+    whitespace is still valid JSON). Once the client has gone away that write
+    fails, the server closes the stream and the token stops the solve at its
+    next placement boundary instead of letting it run to completion.
+    """
+    token = CancellationToken()
+    deadline = time.monotonic() + time_limit
+    outcome = {}
+
+    def work():
+        try:
+            outcome["body"] = solve(deadline, token)
+        except Exception as e:
+            outcome["body"] = {"error": str(e)}
+
+    worker = threading.Thread(target=work, daemon=True)
+    worker.start()
+
+    def body():
+        try:
+            while worker.is_alive():
+                worker.join(KEEPALIVE_SECONDS)
+                if worker.is_alive():
+                    yield " "
+            yield json.dumps(outcome["body"])
+        finally:
+            token.cancel()
+
+    return Response(body(), mimetype="application/json")
 
 
 @app.route("/api/health", methods=["GET"])
@@ -39,117 +142,96 @@ def generate_timetable():
     except Exception:
         return jsonify({"error": "Invalid JSON"}), 400
 
+    ordering = payload.get("ordering", "group")
+    base_version = payload.get("baseVersion")
+    if ordering not in SCHEDULING_ORDERS:
+        return jsonify({"error": f"ordering must be one of {', '.join(SCHEDULING_ORDERS)}"}), 400
+
     try:
-        # Expected payload structure:
-        # {
-        #   rooms: { general: [str], labs: [str], nb: [str] },
-        #   departments: [
-        #     { name, program, semester(int), section(str), workingDays: [str], courses: [ { code,name,creditHours(int),teacher,type } ] }
-        #   ]
-        # }
-
-        generator = UniversityTimetableGenerator()
-
-        # Override days based on union of workingDays if provided
-        all_days = set()
-        for dept in payload.get("departments", []):
-            for d in dept.get("workingDays", []):
-                all_days.add(d.capitalize())
-        if all_days:
-            # Map to title case to match internal comparison (e.g., "Monday")
-            generator.days = [
-                day for day in ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"]
-                if day in all_days
-            ]
-
-        # Override rooms
-        rooms_obj = payload.get("rooms", {})
-        general_rooms = rooms_obj.get("general", []) + rooms_obj.get("nb", [])
-        lab_rooms = rooms_obj.get("labs", [])
-
-        # Reset and add custom rooms only if user provided any rooms
-        if general_rooms or lab_rooms:
-            generator.rooms = {}
-            for r in general_rooms:
-                if isinstance(r, str) and r.strip():
-                    generator.add_custom_room(r.strip(), RoomType.CLASSROOM)
-            for r in lab_rooms:
-                if isinstance(r, str) and r.strip():
-                    generator.add_custom_room(r.strip(), RoomType.LAB)
-
-        # Keep a mapping to reconstruct program in response
-        group_to_program = {}
-
-        for dept in payload.get("departments", []):
-            department_name = dept.get("name") or "Department"
-            program_name = dept.get("program") or "Program"
-            semester = int(dept.get("semester"))
-            section = str(dept.get("section"))
-
-            group_to_program[(semester, section, department_name)] = program_name
-
-            for course in dept.get("courses", []):
-                code = course.get("code", "")
-                name = course.get("name", "")
-                credit_hours = int(course.get("creditHours", 3))
-                teacher = course.get("teacher")
-                ctype = parse_course_type(course.get("type"), credit_hours)
-
-                generator.add_course(
-                    code=code,
-                    name=name,
-                    course_type=ctype,
-                    credit_hours=credit_hours,
-                    semester=semester,
-                    section=section,
-                    department=department_name,
-                    teacher=teacher,
-                )
-
-        # Generate schedule
-        generator.generate_timetable()
+        time_limit = parse_time_limit(payload)
+        if payload.get("templateId"):
+            # Stored catalog plus small per-request overrides; nothing to parse again
+            instance = templates.instantiate(payload["templateId"], payload.get("overrides"))
+            if instance is None:
+                return jsonify({"error": f"Unknown template {payload['templateId']}"}), 404
+            generator, group_to_program = instance
+        else:
+            generator, group_to_program = load_payload(payload)
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid payload: {e}"}), 400
+
+    def solve(deadline: float, token: CancellationToken) -> Dict:
+        # Generate schedule; partial if the deadline passes or the client leaves
+        quality = generator.generate_timetable(ordering=ordering, deadline=deadline, cancel=token)
 
         # Build response to match frontend expectations
-        result = {}
-        for key, classes in generator.schedule.items():
-            day, semester, section = key
-
-            # We may have multiple departments for same semester/section; choose department from each class
-            for scheduled_class in classes:
-                dept_name = scheduled_class.course.department
-                program_name = group_to_program.get((semester, section, dept_name), "Program")
-                program_key = f"{dept_name} - {program_name} - Semester {semester} - Section {section}"
-
-                if program_key not in result:
-                    result[program_key] = []
-
-                for slot in scheduled_class.time_slots:
-                    if slot.day != day:
-                        continue
-                    result[program_key].append({
-                        "time": f"{slot.start_time}-{slot.end_time}",
-                        "day": day.lower(),
-                        "code": scheduled_class.course.code,
-                        "name": scheduled_class.course.name,
-                        "room": slot.room,
-                        "teacher": scheduled_class.course.teacher or "TBA",
-                    })
-
-        # Sort each schedule by time then day for consistency
-        def time_key(item):
-            try:
-                hh, mm = item["time"].split("-")[0].split(":")
-                return (int(hh), int(mm), item["day"]) 
-            except Exception:
-                return (0, 0, item.get("day", "monday"))
-
-        for k in result.keys():
-            result[k] = sorted(result[k], key=time_key)
-
-        return jsonify(result), 200
+        result = build_timetable_response(generator, group_to_program)
+        return versioned_body(result, base_version,
+                              {"quality": quality, "unscheduled": generator.unscheduled_report()})
+
+    return stream_solve(solve, time_limit)
+
 
+@app.route("/api/templates", methods=["POST"])
+def create_template():
+    # Same catalog fields as /api/generate-timetable; the parsed result is kept for reuse
+    try:
+        payload = request.get_json(force=True)
+    except Exception:
+        return jsonify({"error": "Invalid JSON"}), 400
+
+    try:
+        template = templates.put(payload)
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid payload: {e}"}), 400
+    return jsonify(template.summary()), 201
+
+
+@app.route("/api/templates/<template_id>", methods=["GET"])
+def get_template(template_id: str):
+    template = templates.get(template_id)
+    if template is None:
+        return jsonify({"error": f"Unknown template {template_id}"}), 404
+    return jsonify(template.summary()), 200
+
+
+@app.route("/api/templates/<template_id>", methods=["DELETE"])
+def delete_template(template_id: str):
+    if not templates.remove(template_id):
+        return jsonify({"error": f"Unknown template {template_id}"}), 404
+    return jsonify({"templateId": template_id, "deleted": True}), 200
+
+
+@app.route("/api/upload-catalog", methods=["POST"])
+def upload_catalog():
+    # Multipart upload: "courses" (CSV/XLSX, required) and "rooms" (CSV/XLSX, optional).
+    # Rows are streamed into the generator; bad rows are reported, not fatal.
+    courses_file = request.files.get("courses")
+    if courses_file is None:
+        return jsonify({"error": "Missing 'courses' file"}), 400
+    rooms_file = request.files.get("rooms")
+    base_version = request.form.get("baseVersion")
+
+    try:
+        generator, report = load_catalog(
+            courses_file.stream,
+            rooms_file.stream if rooms_file else None,
+            courses_filename=courses_file.filename,
+            rooms_filename=rooms_file.filename if rooms_file else None,
+        )
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return jsonify({"error": str(e)}), 400
+
+    if report.courses_added == 0:
+        return jsonify({"error": "No valid course rows", "ingest": report.to_dict()}), 400
+
+    def solve(deadline: float, token: CancellationToken) -> Dict:
+        quality = generator.generate_timetable(deadline=deadline, cancel=token)
+        result = build_timetable_response(generator, report.programs)
+        return versioned_body(result, base_version, {"quality": quality, "unscheduled": generator.unscheduled_report(),
+                                                     "ingest": report.to_dict()})
+
+    return stream_solve(solve, GENERATION_TIME_LIMIT)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,155 @@
+"""
+Offline batch generation of many timetables in parallel.
+
+Takes payload files (the same JSON body /api/generate-timetable accepts),
+solves them across a process pool and writes each result with the
+generator's JSON/Excel exporters (or as binary snapshots, see snapshot.py),
+then prints a per-input summary.
+
+Usage:
+    python batch.py payloads/ what-if/*.json --out results --workers 4
+    python batch.py payloads/ --format json,excel --summary results/summary.csv
+    python batch.py archive/*.json --format snapshot
+"""
+
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional
+
+from ingest import load_payload
+from server import SCHEDULING_ORDERS, pd
+from snapshot import save_snapshot
+
+SUMMARY_COLUMNS = ["input", "courses", "scheduled", "success_rate", "sessions", "seconds",
+                   "cache_hit_rate", "partial", "error"]
+
+
+def expand_inputs(patterns: List[str]) -> List[str]:
+    """Resolve directories and glob patterns to a sorted, de-duplicated list of files"""
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths.extend(glob.glob(os.path.join(pattern, "*.json")))
+        elif any(ch in pattern for ch in "*?["):
+            paths.extend(glob.glob(pattern))
+        else:
+            paths.append(pattern)
+    return sorted(set(os.path.normpath(p) for p in paths))
+
+
+def solve_payload_file(path: str, out_dir: str, formats: List[str], ordering: str = "group",
+                       time_limit: Optional[float] = None) -> Dict:
+    """Solve a single payload file and export it; runs inside a worker process"""
+    row = {"input": path, "courses": 0, "scheduled": 0, "success_rate": 0.0,
+           "sessions": 0, "seconds": 0.0, "cache_hit_rate": 0.0, "partial": False, "error": ""}
+    try:
+        with open(path) as f:
+            payload = json.load(f)
+        generator, _ = load_payload(payload)
+
+        start = time.perf_counter()
+        deadline = time.monotonic() + time_limit if time_limit else None
+        quality = generator.generate_timetable(ordering=payload.get("ordering", ordering), deadline=deadline)
+        row["seconds"] = time.perf_counter() - start
+        row["partial"] = quality["partial"]
+
+        row["courses"] = quality["totalCourses"]
+        row["scheduled"] = quality["scheduledCourses"]
+        row["sessions"] = quality["scheduledSessions"]
+        row["cache_hit_rate"] = 100.0 * generator.slot_cache_stats()["hitRate"]
+        if row["courses"]:
+            row["success_rate"] = 100.0 * row["scheduled"] / row["courses"]
+
+        stem = os.path.splitext(os.path.basename(path))[0]
+        if "json" in formats:
+            generator.export_to_json(os.path.join(out_dir, f"{stem}.timetable.json"))
+        if "excel" in formats:
+            generator.export_to_excel(os.path.join(out_dir, f"{stem}.timetable.xlsx"))
+        if "snapshot" in formats:
+            save_snapshot(generator, os.path.join(out_dir, f"{stem}.tts"))
+    except Exception as e:
+        row["error"] = f"{type(e).__name__}: {e}"
+    return row
+
+
+def print_summary(rows: List[Dict]):
+    """Print an aligned summary table plus totals"""
+    header = ["Input", "Courses", "Scheduled", "Success %", "Sessions", "Seconds", "Cache hit %", "Partial", "Error"]
+    lines = [[
+        row["input"], str(row["courses"]), str(row["scheduled"]),
+        f"{row['success_rate']:.1f}", str(row["sessions"]), f"{row['seconds']:.2f}",
+        f"{row['cache_hit_rate']:.1f}", "yes" if row["partial"] else "", row["error"],
+    ] for row in rows]
+    widths = [max(len(h), *(len(line[i]) for line in lines)) if lines else len(h)
+              for i, h in enumerate(header)]
+
+    print("  ".join(h.ljust(w) for h, w in zip(header, widths)))
+    print("-" * (sum(widths) + 2 * (len(widths) - 1)))
+    for line in lines:
+        print("  ".join(value.ljust(w) for value, w in zip(line, widths)))
+
+    ok = [row for row in rows if not row["error"]]
+    total_courses = sum(row["courses"] for row in ok)
+    total_scheduled = sum(row["scheduled"] for row in ok)
+    rate = 100.0 * total_scheduled / total_courses if total_courses else 0.0
+    print(f"\n{len(ok)}/{len(rows)} inputs solved, "
+          f"{total_scheduled}/{total_courses} courses scheduled ({rate:.1f}%), "
+          f"{sum(row['seconds'] for row in ok):.2f}s solver time")
+
+
+def write_summary_csv(rows: List[Dict], filename: str):
+    with open(filename, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Generate many timetables from payload files in parallel")
+    parser.add_argument("inputs", nargs="+", help="payload files, directories or glob patterns")
+    parser.add_argument("--out", default="batch_results", help="output directory (default: batch_results)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--format", default="json",
+                        help="comma-separated exporters to run: json, excel, snapshot (default: json)")
+    parser.add_argument("--ordering", choices=SCHEDULING_ORDERS, default="group",
+                        help="session ordering when a payload does not set one (default: group)")
+    parser.add_argument("--time-limit", type=float,
+                        help="seconds per input; slower solves stop early and are marked partial")
+    parser.add_argument("--summary", help="also write the summary table to this CSV file")
+    args = parser.parse_args(argv)
+
+    formats = [f.strip().lower() for f in args.format.split(",") if f.strip()]
+    unknown = set(formats) - {"json", "excel", "snapshot"}
+    if unknown:
+        parser.error(f"unknown format(s): {', '.join(sorted(unknown))}")
+    if "excel" in formats and pd is None:
+        parser.error("pandas is not installed; Excel export is unavailable")
+
+    paths = expand_inputs(args.inputs)
+    if not paths:
+        parser.error("no payload files matched")
+    os.makedirs(args.out, exist_ok=True)
+
+    rows = []
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        futures = [pool.submit(solve_payload_file, path, args.out, formats, args.ordering, args.time_limit)
+                   for path in paths]
+        for future in as_completed(futures):
+            rows.append(future.result())
+    rows.sort(key=lambda row: row["input"])
+
+    print_summary(rows)
+    if args.summary:
+        write_summary_csv(rows, args.summary)
+
+    return 1 if any(row["error"] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""
+Server-side catalog templates.
+
+A template is a generation payload's catalog (rooms, departments, calendars,
+time grid, blackouts) parsed once into a generator whose room index is
+already built. Requests then reference it by id with small overrides; each
+generation works on a fork(), so courses and rooms are shared rather than
+parsed again, and the template itself is never scheduled. Templates are
+kept per process in a bounded LRU, like delta.VersionStore.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+from server import UniversityTimetableGenerator
+from ingest import add_blackouts, add_calendars, add_departments, add_rooms, load_payload
+from lru import BoundedLRU
+
+# Payload fields that make up a template; anything else is per request
+TEMPLATE_FIELDS = ("rooms", "departments", "calendars", "timeGrid", "blackouts")
+OVERRIDE_FIELDS = ("removeRooms", "rooms", "removeCourses", "departments", "blackouts")
+
+
+def template_id(payload: Dict) -> str:
+    """Content hash of the template fields; resubmitting the same catalog reuses its id"""
+    catalog = {name: payload[name] for name in TEMPLATE_FIELDS if name in payload}
+    canonical = json.dumps(catalog, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass
+class CatalogTemplate:
+    """A parsed catalog and the group -> program mapping for its responses"""
+    template_id: str
+    generator: UniversityTimetableGenerator
+    group_to_program: Dict[Tuple[int, str, str], str]
+    created: float = field(default_factory=time.time)
+
+    def summary(self) -> Dict:
+        return {
+            "templateId": self.template_id,
+            "courses": len(self.generator.courses),
+            "rooms": len(self.generator.rooms),
+            "groups": len(self.group_to_program),
+            "created": self.created,
+        }
+
+
+def apply_overrides(generator: UniversityTimetableGenerator, group_to_program: Dict[Tuple[int, str, str], str],
+                    overrides: Dict):
+    """Apply per-request changes to a forked template
+
+    Supported keys: removeRooms (ids), rooms ({ general, labs, nb } added to
+    the template's rooms), removeCourses ([{ code, semester?, section?,
+    department? }]), departments (extra department entries, as in a payload,
+    whose workingDays and workingHours extend the calendars and working days)
+    and blackouts (extra blackout entries).
+    """
+    unknown = set(overrides) - set(OVERRIDE_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown override field(s): {', '.join(sorted(unknown))}")
+    for room_id in overrides.get("removeRooms", []):
+        if room_id not in generator.rooms:
+            raise ValueError(f"Unknown room {room_id!r}")
+        generator.remove_room(room_id)
+    add_rooms(generator, overrides.get("rooms", {}))
+    for entry in overrides.get("removeCourses", []):
+        semester = entry.get("semester")
+        section = entry.get("section")
+        generator.remove_courses(
+            entry["code"],
+            semester=int(semester) if semester is not None else None,
+            section=str(section) if section is not None else None,
+            department=entry.get("department"),
+        )
+    add_calendars(generator, overrides.get("departments", []))
+    add_departments(generator, overrides.get("departments", []), group_to_program)
+    add_blackouts(generator, overrides.get("blackouts", []))
+
+
+class TemplateStore:
+    """Parsed catalog templates by id, bounded LRU"""
+
+    def __init__(self, capacity: int = 64):
+        self._templates = BoundedLRU(capacity)
+        self._fork_lock = threading.Lock()  # fork() touches the template's bookkeeping
+
+    def put(self, payload: Dict) -> CatalogTemplate:
+        """Parse and index a payload's catalog, or return the stored copy of an identical one"""
+        key = template_id(payload)
+        existing = self.get(key)
+        if existing is not None:
+            return existing
+
+        generator, group_to_program = load_payload(payload)
+        generator._room_index()
+        template = CatalogTemplate(key, generator, group_to_program)
+        self._templates.put(key, template)
+        return template
+
+    def get(self, key: str) -> Optional[CatalogTemplate]:
+        return self._templates.get(key)
+
+    def remove(self, key: str) -> bool:
+        return self._templates.pop(key) is not None
+
+    def instantiate(self, key: str, overrides: Optional[Dict] = None
+                    ) -> Optional[Tuple[UniversityTimetableGenerator, Dict[Tuple[int, str, str], str]]]:
+        """Fresh generator and program mapping for one generation; None if the id is unknown"""
+        template = self.get(key)
+        if template is None:
+            return None
+        with self._fork_lock:
+            generator = template.generator.fork()
+        generator.discard()
+        group_to_program = dict(template.group_to_program)
+        if overrides:
+            apply_overrides(generator, group_to_program, overrides)
+        return generator, group_to_program
@@ -0,0 +1,97 @@
+"""
+Versioned timetable results and compact deltas between them.
+
+A timetable here is the per-program dict app.build_timetable_response()
+returns: {program key: [{time, day, code, name, room, teacher}, ...]}.
+timetable_version() derives a stable id from its content, diff_timetables()
+lists the sessions added, removed or moved between two versions and
+apply_delta() replays such a diff on the older copy. VersionStore keeps the
+most recent results in memory so a client that sends the version it already
+has can be answered with a diff instead of the full timetable.
+"""
+
+import hashlib
+import json
+from typing import Dict, List, Optional
+
+from lru import BoundedLRU
+
+Timetable = Dict[str, List[Dict]]
+
+
+def timetable_version(timetable: Timetable) -> str:
+    """Content hash of a timetable; equal timetables always get the same id"""
+    canonical = json.dumps(timetable, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def _session_key(session: Dict) -> tuple:
+    return tuple(sorted(session.items()))
+
+
+def diff_timetables(old: Timetable, new: Timetable) -> Dict[str, List[Dict]]:
+    """Sessions added, removed or moved going from old to new
+
+    Identical sessions are unchanged. Of the rest, sessions of the same course
+    in the same program are paired up in order as moves (new day, time or
+    room); whatever cannot be paired is added or removed.
+    """
+    added, removed, moved = [], [], []
+    for program in sorted(set(old) | set(new)):
+        remaining = {}
+        for session in old.get(program, []):
+            remaining.setdefault(_session_key(session), []).append(session)
+        appeared = []
+        for session in new.get(program, []):
+            same = remaining.get(_session_key(session))
+            if same:
+                same.pop()
+            else:
+                appeared.append(session)
+        gone = [session for sessions in remaining.values() for session in sessions]
+
+        gone_by_code = {}
+        for session in gone:
+            gone_by_code.setdefault(session["code"], []).append(session)
+        for session in appeared:
+            candidates = gone_by_code.get(session["code"])
+            if candidates:
+                moved.append({"program": program, "from": candidates.pop(0), "to": session})
+            else:
+                added.append({"program": program, "session": session})
+        for sessions in gone_by_code.values():
+            removed.extend({"program": program, "session": session} for session in sessions)
+
+    return {"added": added, "removed": removed, "moved": moved}
+
+
+def apply_delta(old: Timetable, delta: Dict[str, List[Dict]]) -> Timetable:
+    """Rebuild the newer timetable from the older one and diff_timetables() output
+
+    Programs left without sessions are dropped, as they would be from a fresh
+    timetable.
+    """
+    timetable = {program: list(sessions) for program, sessions in old.items()}
+    for change in delta["removed"]:
+        timetable[change["program"]].remove(change["session"])
+    for change in delta["moved"]:
+        sessions = timetable[change["program"]]
+        sessions[sessions.index(change["from"])] = change["to"]
+    for change in delta["added"]:
+        timetable.setdefault(change["program"], []).append(change["session"])
+    return {program: sessions for program, sessions in timetable.items() if sessions}
+
+
+class VersionStore:
+    """Most recently delivered timetables by version id, bounded LRU"""
+
+    def __init__(self, capacity: int = 256):
+        self._timetables = BoundedLRU(capacity)
+
+    def put(self, timetable: Timetable) -> str:
+        version = timetable_version(timetable)
+        self._timetables.put(version, timetable)
+        return version
+
+    def get(self, version: str) -> Optional[Timetable]:
+        return self._timetables.get(version)
@@ -0,0 +1,318 @@
+"""
+Incremental schedule quality evaluation.
+
+ScheduleEvaluator keeps running totals for a UniversityTimetableGenerator's
+schedule and updates them in O(sessions sharing the affected room, group,
+teacher and day) whenever a session is added, removed or moved. Search
+strategies can therefore compare candidate placements without rescanning
+the whole timetable.
+
+Tracked metrics:
+- hard-constraint violations: room, group and teacher overlaps, sessions
+  outside the course's calendar (MORNING/EVENING window or department
+  working days and hours), groups over the weekly hour cap, wrong room
+  type, rooms too small for the enrollment and sessions overlapping a
+  room, teacher or group blackout
+- unscheduled sessions (expected sessions minus placed sessions)
+- idle gap hours per group-day
+- day balance (variance of daily hours per group, summed over groups)
+- teacher load spread (standard deviation of weekly teacher hours)
+- room utilization (booked room-hours / available room-hours)
+
+Members of a combined lecture (same lecture tag, day, time and room) share a
+session, so its room, teacher and each distinct group are counted once.
+"""
+
+from collections import defaultdict
+from typing import Dict, Tuple
+
+VIOLATION_KINDS = (
+    "room_clashes", "group_clashes", "teacher_clashes", "window_violations",
+    "weekly_cap_violations", "room_type_violations", "capacity_violations", "blackout_violations",
+)
+
+
+def _to_minutes(hhmm: str) -> int:
+    hours, minutes = hhmm.split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+def _overlaps(intervals: Tuple[Tuple, ...], start: int, end: int) -> int:
+    return sum(1 for s, e, *_ in intervals if start < e and s < end)
+
+
+def _clashes(intervals: Tuple[Tuple, ...], interval: Tuple) -> int:
+    """Overlaps with interval, ignoring the same combined lecture's session
+
+    Every member of a combined lecture stores its own copy of the tagged
+    interval; the lecture is one session, so the copies count once.
+    """
+    start, end, tag = interval
+    return len({other if other[2] is not None else (index,)
+                for index, other in enumerate(intervals)
+                if start < other[1] and other[0] < end and (tag is None or other != interval)})
+
+
+def _discard(store: Dict, key, interval: Tuple):
+    intervals = list(store[key])
+    intervals.remove(interval)
+    store[key] = tuple(intervals)
+
+
+def _idle_minutes(intervals: Tuple[Tuple[int, int], ...]) -> int:
+    """Minutes between the first start and last end that nobody is in class"""
+    idle = 0
+    last_end = None
+    for start, end, _ in sorted(intervals, key=lambda interval: interval[:2]):
+        if last_end is not None and start > last_end:
+            idle += start - last_end
+        last_end = end if last_end is None else max(last_end, end)
+    return idle
+
+
+class ScheduleEvaluator:
+    def __init__(self, generator):
+        self.generator = generator
+        self.days = list(generator.days)
+        day_minutes = (generator.end_time - generator.start_time).seconds // 60
+        self.available_room_minutes = len(generator.rooms) * len(self.days) * day_minutes
+
+        self.violations = {kind: 0 for kind in VIOLATION_KINDS}
+
+        # (day, resource) -> ((start, end, lecture tag), ...) for overlap
+        # detection. Values are immutable so fork() only has to copy the
+        # top-level dicts.
+        self._room_day = defaultdict(tuple)
+        self._group_day = defaultdict(tuple)
+        self._teacher_day = defaultdict(tuple)
+
+        self._idle = {}  # (day, group) -> idle minutes
+        self.idle_minutes = 0
+
+        self._group_minutes = defaultdict(int)
+        self._group_daily = defaultdict(int)  # (group, day) -> minutes
+        self._group_variance = {}
+        self.day_balance = 0.0
+
+        self._teacher_minutes = defaultdict(int)
+        self._loaded_teachers = 0
+        self._teacher_sum = 0
+        self._teacher_sum_sq = 0
+
+        self.booked_room_minutes = 0
+        self._seats = defaultdict(int)  # (day, room, start, end, tag) -> combined enrollment
+
+        self._expected = {}
+        self._placed = defaultdict(int)
+        self.expected_sessions = 0
+        self.scheduled_sessions = 0
+        self.unscheduled_sessions = 0
+        self.scheduled_courses = 0
+        for course in generator.courses:
+            self._expect(course)
+
+        # Seed with whatever is already scheduled
+        seen = set()
+        for classes in generator.schedule.values():
+            for scheduled_class in classes:
+                if id(scheduled_class) in seen:
+                    continue
+                seen.add(id(scheduled_class))
+                for slot in scheduled_class.time_slots:
+                    self.add_session(scheduled_class.course, slot)
+
+    def fork(self, generator) -> "ScheduleEvaluator":
+        """Independent copy for a forked generator
+
+        Every per-key value is immutable (ints, floats, tuples), so copying the
+        top-level dicts is enough; the entries themselves are shared.
+        """
+        child = object.__new__(ScheduleEvaluator)
+        for name, value in self.__dict__.items():
+            setattr(child, name, value.copy() if isinstance(value, dict) else value)
+        child.generator = generator
+        return child
+
+    # --- bookkeeping helpers -------------------------------------------------
+
+    def _expect(self, course) -> int:
+        key = id(course)
+        if key not in self._expected:
+            expected = self.generator._get_classes_per_week(course.course_type)
+            self._expected[key] = expected
+            self.expected_sessions += expected
+            self.unscheduled_sessions += expected
+        return self._expected[key]
+
+    def _update_group_day(self, day: str, group: Tuple[int, str]):
+        key = (day, group)
+        idle = _idle_minutes(self._group_day[key])
+        self.idle_minutes += idle - self._idle.get(key, 0)
+        self._idle[key] = idle
+
+    def _update_group_variance(self, group: Tuple[int, str]):
+        daily = [self._group_daily[(group, day)] for day in self.days]
+        n = len(self.days) or 1
+        mean = sum(daily) / n
+        variance = sum(m * m for m in daily) / n - mean * mean
+        self.day_balance += variance - self._group_variance.get(group, 0.0)
+        self._group_variance[group] = variance
+
+    def _adjust_teacher(self, teacher: str, delta: int):
+        old = self._teacher_minutes[teacher]
+        new = old + delta
+        self._teacher_minutes[teacher] = new
+        self._loaded_teachers += int(new > 0) - int(old > 0)
+        self._teacher_sum += delta
+        self._teacher_sum_sq += new * new - old * old
+
+    def _apply(self, course, slot, sign: int):
+        """Add (sign=+1) or remove (sign=-1) one session's contribution
+
+        Members of a combined lecture share one session: a room, group or
+        teacher already holding the identical tagged interval is counted once.
+        """
+        day = slot.day
+        start, end = _to_minutes(slot.start_time), _to_minutes(slot.end_time)
+        minutes = end - start
+        group = (course.semester, course.section)
+        tag = self.generator._lecture_tag(course)
+        interval = (start, end, tag)
+
+        room_key = (day, slot.room)
+        group_key = (day, group)
+        teacher_key = (day, course.teacher) if course.teacher else None
+
+        if sign < 0:
+            _discard(self._room_day, room_key, interval)
+            _discard(self._group_day, group_key, interval)
+            if teacher_key:
+                _discard(self._teacher_day, teacher_key, interval)
+
+        room_new = tag is None or interval not in self._room_day[room_key]
+        group_new = tag is None or interval not in self._group_day[group_key]
+        teacher_new = teacher_key is not None and (tag is None or interval not in self._teacher_day[teacher_key])
+
+        blackouts = ()
+        if room_new:
+            self.violations["room_clashes"] += sign * _clashes(self._room_day[room_key], interval)
+            blackouts += self.generator._blackout_intervals("room", slot.room, day)
+        if group_new:
+            self.violations["group_clashes"] += sign * _clashes(self._group_day[group_key], interval)
+            blackouts += self.generator._blackout_intervals("group", group, day)
+        if teacher_new:
+            self.violations["teacher_clashes"] += sign * _clashes(self._teacher_day[teacher_key], interval)
+            blackouts += self.generator._blackout_intervals("teacher", course.teacher, day)
+        self.violations["blackout_violations"] += sign * _overlaps(blackouts, start, end)
+
+        if sign > 0:
+            self._room_day[room_key] += (interval,)
+            self._group_day[group_key] += (interval,)
+            if teacher_key:
+                self._teacher_day[teacher_key] += (interval,)
+
+        if not self.generator._calendar_allows(course, day, start, end):
+            self.violations["window_violations"] += sign
+
+        room = self.generator.rooms.get(slot.room)
+        if room is not None:
+            if room_new and room.room_type != self.generator._get_room_type(course):
+                self.violations["room_type_violations"] += sign
+            if tag is None:
+                if room.capacity < course.enrolled_students:
+                    self.violations["capacity_violations"] += sign
+            else:
+                seats_key = (day, slot.room, start, end, tag)
+                was_over = self._seats[seats_key] > room.capacity
+                self._seats[seats_key] += sign * course.enrolled_students
+                is_over = self._seats[seats_key] > room.capacity
+                self.violations["capacity_violations"] += int(is_over) - int(was_over)
+
+        if group_new:
+            cap = self.generator.max_weekly_hours * 60
+            was_over = self._group_minutes[group] > cap
+            self._group_minutes[group] += sign * minutes
+            is_over = self._group_minutes[group] > cap
+            self.violations["weekly_cap_violations"] += int(is_over) - int(was_over)
+
+            self._group_daily[(group, day)] += sign * minutes
+            self._update_group_day(day, group)
+            self._update_group_variance(group)
+
+        if teacher_new:
+            self._adjust_teacher(course.teacher, sign * minutes)
+
+        if room_new:
+            self.booked_room_minutes += sign * minutes
+
+        expected = self._expect(course)
+        placed = self._placed[id(course)]
+        self._placed[id(course)] = placed + sign
+        self.scheduled_sessions += sign
+        if sign > 0:
+            if placed < expected:
+                self.unscheduled_sessions -= 1
+            if placed + 1 == expected:
+                self.scheduled_courses += 1
+        else:
+            if placed <= expected:
+                self.unscheduled_sessions += 1
+            if placed == expected:
+                self.scheduled_courses -= 1
+
+    # --- public API ----------------------------------------------------------
+
+    def add_session(self, course, slot):
+        """Account for a newly placed session (a TimeSlotInfo of course)"""
+        self._apply(course, slot, +1)
+
+    def remove_session(self, course, slot):
+        """Undo add_session for a session that is being unscheduled"""
+        self._apply(course, slot, -1)
+
+    def move_session(self, course, old_slot, new_slot):
+        self._apply(course, old_slot, -1)
+        self._apply(course, new_slot, +1)
+
+    @property
+    def hard_violations(self) -> int:
+        return sum(self.violations.values())
+
+    @property
+    def teacher_load_spread(self) -> float:
+        """Standard deviation of weekly hours across teachers with any load"""
+        n = self._loaded_teachers
+        if not n:
+            return 0.0
+        mean = self._teacher_sum / n
+        variance = max(0.0, self._teacher_sum_sq / n - mean * mean)
+        return (variance ** 0.5) / 60
+
+    @property
+    def room_utilization(self) -> float:
+        if not self.available_room_minutes:
+            return 0.0
+        return self.booked_room_minutes / self.available_room_minutes
+
+    def soft_penalty(self) -> float:
+        return self.idle_minutes / 60 + self.day_balance / 3600 + self.teacher_load_spread
+
+    def score(self) -> Tuple[int, int, float]:
+        """Lexicographic cost, lower is better: (hard, unscheduled, soft)"""
+        return (self.hard_violations, self.unscheduled_sessions, round(self.soft_penalty(), 4))
+
+    def summary(self) -> Dict:
+        return {
+            "hardViolations": self.hard_violations,
+            "violations": dict(self.violations),
+            "expectedSessions": self.expected_sessions,
+            "scheduledSessions": self.scheduled_sessions,
+            "unscheduledSessions": self.unscheduled_sessions,
+            "scheduledCourses": self.scheduled_courses,
+            "totalCourses": len(self._expected),
+            "idleGapHours": round(self.idle_minutes / 60, 2),
+            "dayBalance": round(self.day_balance / 3600, 3),
+            "teacherLoadSpread": round(self.teacher_load_spread, 3),
+            "roomUtilization": round(self.room_utilization, 4),
+            "score": list(self.score()),
+        }
@@ -0,0 +1,452 @@
+"""
+Bulk catalog ingestion from CSV/XLSX course and room sheets.
+
+Rows are streamed straight into a UniversityTimetableGenerator in a single
+pass. Invalid rows are recorded in an IngestReport and skipped instead of
+aborting the whole upload, so a registrar export with a few bad lines still
+produces a timetable plus a list of rows to fix.
+
+Course sheet columns (header names are case/space insensitive):
+    department, program, semester, section, code, name, creditHours,
+    teacher, type, enrolledStudents, combineKey (courses sharing a key,
+    type and teacher are taught as one combined lecture)
+Room sheet columns:
+    id, type (classroom | lab | nb), capacity
+
+load_payload() builds a generator from the same JSON body that
+/api/generate-timetable accepts, for callers that do not go through HTTP.
+"""
+
+import csv
+import io
+import os
+from dataclasses import dataclass, field
+from typing import IO, Dict, Iterator, List, Optional, Tuple, Union
+
+from server import UniversityTimetableGenerator, CourseType, RoomType
+try:
+    import openpyxl  # optional; only needed for XLSX ingestion
+except Exception:
+    openpyxl = None
+
+DEFAULT_ROOM_CAPACITY = 50
+DEFAULT_ENROLLMENT = 30
+
+# Normalized header -> canonical column name
+COURSE_COLUMNS = {
+    "department": "department", "dept": "department",
+    "program": "program",
+    "semester": "semester",
+    "section": "section",
+    "code": "code", "coursecode": "code",
+    "name": "name", "coursename": "name", "title": "name",
+    "credithours": "credit_hours", "credits": "credit_hours",
+    "teacher": "teacher", "instructor": "teacher",
+    "type": "type", "coursetype": "type",
+    "enrolledstudents": "enrolled_students", "enrollment": "enrolled_students",
+    "combinekey": "combine_key", "combinewith": "combine_key",
+}
+
+ROOM_COLUMNS = {
+    "id": "id", "room": "id", "roomid": "id", "name": "id",
+    "type": "type", "roomtype": "type",
+    "capacity": "capacity", "seats": "capacity",
+}
+
+Source = Union[str, IO]
+
+
+def parse_course_type(type_str: str, credit_hours: int) -> CourseType:
+    if type_str:
+        normalized = type_str.strip().upper()
+        if normalized == "LAB":
+            return CourseType.LAB
+        if normalized in ("THEORY", "THEORY_3", "THEORY_3CR"):
+            return CourseType.THEORY_3CR
+        if normalized in ("THEORY_2", "THEORY_2CR"):
+            return CourseType.THEORY_2CR
+
+    # Fallback based on credit hours
+    if credit_hours == 3:
+        return CourseType.THEORY_3CR
+    if credit_hours == 2:
+        return CourseType.THEORY_2CR
+    # default to 3CR theory
+    return CourseType.THEORY_3CR
+
+
+def parse_room_type(type_str: str) -> RoomType:
+    """Labs are LAB; anything else (general, nb, blank) is a classroom"""
+    if type_str and type_str.strip().upper() in ("LAB", "LABS"):
+        return RoomType.LAB
+    return RoomType.CLASSROOM
+
+
+def _positive_int(value, what: str) -> int:
+    number = int(value)
+    if number <= 0:
+        raise ValueError(f"{what} must be positive, got {value!r}")
+    return number
+
+
+def parse_room_entry(entry) -> Optional[Tuple[str, int]]:
+    """Accept either a plain room id or an object like { id, capacity }"""
+    if isinstance(entry, str):
+        room_id = entry.strip()
+        return (room_id, DEFAULT_ROOM_CAPACITY) if room_id else None
+    if isinstance(entry, dict):
+        room_id = str(entry.get("id") or entry.get("name") or "").strip()
+        if not room_id:
+            return None
+        return room_id, _positive_int(entry.get("capacity", DEFAULT_ROOM_CAPACITY), f"capacity of room {room_id}")
+    return None
+
+
+def parse_blackout_target(entry: Dict) -> Tuple[str, object]:
+    """Which resource a payload blackout applies to: a room, a teacher or a group"""
+    if entry.get("room"):
+        return "room", str(entry["room"])
+    if entry.get("teacher"):
+        return "teacher", str(entry["teacher"])
+    if entry.get("semester") is not None and entry.get("section") is not None:
+        return "group", (int(entry["semester"]), str(entry["section"]))
+    raise ValueError("blackout needs a room, a teacher or a semester and section")
+
+
+def parse_combine_key(course: Dict) -> Optional[str]:
+    """combineKey names the shared lecture; combinable: true shares it by course code"""
+    if course.get("combineKey"):
+        return str(course["combineKey"])
+    if course.get("combinable"):
+        return course.get("code") or None
+    return None
+
+
+@dataclass
+class IngestReport:
+    courses_added: int = 0
+    rooms_added: int = 0
+    errors: List[Dict] = field(default_factory=list)
+    # (semester, section, department) -> program, for building API responses
+    programs: Dict[Tuple[int, str, str], str] = field(default_factory=dict)
+
+    def add_error(self, sheet: str, row: int, message: str):
+        self.errors.append({"sheet": sheet, "row": row, "error": message})
+
+    def to_dict(self) -> Dict:
+        return {
+            "coursesAdded": self.courses_added,
+            "roomsAdded": self.rooms_added,
+            "errors": self.errors,
+        }
+
+
+def _normalize_header(value) -> str:
+    return "".join(ch for ch in str(value or "").lower() if ch.isalnum())
+
+
+def _cell(value) -> str:
+    if value is None:
+        return ""
+    # openpyxl hands back floats for numeric cells ("3.0" -> "3")
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _parse_int(row: Dict[str, str], column: str, default: Optional[int] = None) -> int:
+    value = row.get(column, "")
+    if not value:
+        if default is None:
+            raise ValueError(f"missing {column}")
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"invalid {column} {value!r}") from None
+
+
+def _is_xlsx(filename: Optional[str]) -> bool:
+    return bool(filename) and os.path.splitext(filename)[1].lower() in (".xlsx", ".xlsm")
+
+
+def _iter_csv(source: Source) -> Iterator[List[str]]:
+    if isinstance(source, str):
+        with open(source, newline="", encoding="utf-8-sig") as f:
+            yield from csv.reader(f)
+        return
+    stream = source
+    if not isinstance(source, io.TextIOBase):
+        stream = io.TextIOWrapper(source, encoding="utf-8-sig", newline="")
+    yield from csv.reader(stream)
+
+
+def _iter_xlsx(source: Source) -> Iterator[List[str]]:
+    if openpyxl is None:
+        raise RuntimeError("openpyxl is not installed; XLSX ingestion is unavailable")
+    workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    try:
+        for values in workbook.active.iter_rows(values_only=True):
+            yield [_cell(v) for v in values]
+    finally:
+        workbook.close()
+
+
+def iter_rows(source: Source, columns: Dict[str, str],
+              filename: Optional[str] = None) -> Iterator[Tuple[int, Dict[str, str]]]:
+    """Yield (sheet row number, {canonical column: value}) for each non-blank row"""
+    if filename is None and isinstance(source, str):
+        filename = source
+    raw_rows = _iter_xlsx(source) if _is_xlsx(filename) else _iter_csv(source)
+
+    header = None
+    for row_number, values in enumerate(raw_rows, start=1):
+        if header is None:
+            header = [columns.get(_normalize_header(h)) for h in values]
+            continue
+        row = {}
+        for name, value in zip(header, values):
+            if name:
+                row[name] = _cell(value)
+        if any(row.values()):
+            yield row_number, row
+
+
+def ingest_rooms(generator: UniversityTimetableGenerator, source: Source,
+                 filename: Optional[str] = None,
+                 report: Optional[IngestReport] = None) -> IngestReport:
+    """Stream a room sheet into the generator, replacing the default rooms"""
+    report = report or IngestReport()
+    replaced_defaults = False
+
+    for row_number, row in iter_rows(source, ROOM_COLUMNS, filename):
+        room_id = row.get("id", "")
+        if not room_id:
+            report.add_error("rooms", row_number, "missing room id")
+            continue
+        try:
+            capacity = _parse_int(row, "capacity", DEFAULT_ROOM_CAPACITY)
+        except ValueError as e:
+            report.add_error("rooms", row_number, str(e))
+            continue
+        if capacity <= 0:
+            report.add_error("rooms", row_number, "capacity must be positive")
+            continue
+
+        if not replaced_defaults:
+            generator.rooms = {}
+            replaced_defaults = True
+        generator.add_custom_room(room_id, parse_room_type(row.get("type", "")), capacity)
+        report.rooms_added += 1
+
+    return report
+
+
+def ingest_courses(generator: UniversityTimetableGenerator, source: Source,
+                   filename: Optional[str] = None,
+                   report: Optional[IngestReport] = None) -> IngestReport:
+    """Stream a course sheet into the generator"""
+    report = report or IngestReport()
+
+    for row_number, row in iter_rows(source, COURSE_COLUMNS, filename):
+        code = row.get("code", "")
+        if not code:
+            report.add_error("courses", row_number, "missing course code")
+            continue
+        section = row.get("section", "")
+        if not section:
+            report.add_error("courses", row_number, "missing section")
+            continue
+        try:
+            semester = _parse_int(row, "semester")
+            credit_hours = _parse_int(row, "credit_hours", 3)
+            enrolled = _parse_int(row, "enrolled_students", DEFAULT_ENROLLMENT)
+        except ValueError as e:
+            report.add_error("courses", row_number, str(e))
+            continue
+        if semester <= 0:
+            report.add_error("courses", row_number, "semester must be positive")
+            continue
+        if credit_hours <= 0:
+            report.add_error("courses", row_number, "credit hours must be positive")
+            continue
+        if enrolled <= 0:
+            report.add_error("courses", row_number, "enrollment must be positive")
+            continue
+
+        department = row.get("department") or "Department"
+        report.programs[(semester, section, department)] = row.get("program") or "Program"
+
+        generator.add_course(
+            code=code,
+            name=row.get("name", ""),
+            course_type=parse_course_type(row.get("type", ""), credit_hours),
+            credit_hours=credit_hours,
+            semester=semester,
+            section=section,
+            department=department,
+            teacher=row.get("teacher") or None,
+            enrolled_students=enrolled,
+            program=row.get("program") or None,
+            combine_key=row.get("combine_key") or None,
+        )
+        report.courses_added += 1
+
+    return report
+
+
+def load_catalog(courses: Source, rooms: Optional[Source] = None,
+                 generator: Optional[UniversityTimetableGenerator] = None,
+                 courses_filename: Optional[str] = None,
+                 rooms_filename: Optional[str] = None) -> Tuple[UniversityTimetableGenerator, IngestReport]:
+    """Build (or extend) a generator from course and optional room sheets"""
+    generator = generator or UniversityTimetableGenerator()
+    report = IngestReport()
+    if rooms is not None:
+        ingest_rooms(generator, rooms, rooms_filename, report)
+    ingest_courses(generator, courses, courses_filename, report)
+    return generator, report
+
+
+def load_payload(payload: Dict) -> Tuple[UniversityTimetableGenerator, Dict[Tuple[int, str, str], str]]:
+    """Build a generator from an /api/generate-timetable JSON payload.
+
+    Returns the generator and the (semester, section, department) -> program
+    mapping used to label the response.
+    """
+    # Expected payload structure:
+    # {
+    #   rooms: { general: [str | {id, capacity}], labs: [...], nb: [...] },
+    #   departments: [
+    #     { name, program, semester(int), section(str), workingDays: [str], enrolledStudents(int, optional),
+    #       workingHours: [ { start: "HH:MM", end: "HH:MM" } ] (optional),
+    #       courses: [ { code,name,creditHours(int),teacher,type,enrolledStudents(int, optional),
+    #                    combinable(bool, optional) | combineKey(str, optional) } ] }
+    #   ],
+    #   calendars: [ { department, program(optional), days: [str], hours: [ {start, end} ] } ] (optional),
+    #     (a program calendar's empty days or hours fall back to its department's calendar)
+    #   timeGrid: { start: "HH:MM", end: "HH:MM", slotMinutes(int) } (optional),
+    #   blackouts: [ { room | teacher | semester+section, day | days (default all), start, end } ] (optional),
+    #   ordering: "group" | "global" (optional, read by the caller when solving)
+    # }
+
+    generator = UniversityTimetableGenerator()
+
+    grid = payload.get("timeGrid")
+    if grid:
+        generator.configure_time_grid(grid.get("start", "08:00"), grid.get("end", "21:30"),
+                                      int(grid.get("slotMinutes", generator.slot_minutes)))
+
+    # Working days become the union of workingDays if provided; each entry's own
+    # days (and optional hours) become its department/program calendar
+    add_calendars(generator, payload.get("departments", []), payload.get("calendars", []), replace_days=True)
+
+    add_blackouts(generator, payload.get("blackouts", []))
+
+    # Reset and add custom rooms only if user provided any rooms
+    add_rooms(generator, payload.get("rooms", {}), replace=True)
+
+    # Keep a mapping to reconstruct program in response
+    group_to_program = {}
+    add_departments(generator, payload.get("departments", []), group_to_program)
+
+    return generator, group_to_program
+
+
+def add_calendars(generator: UniversityTimetableGenerator, departments: List[Dict],
+                  calendars: List[Dict] = (), replace_days: bool = False):
+    """Set calendars from department workingDays/workingHours and calendar entries
+
+    Department entries of one department and program share the union of their
+    days and hours (and of any calendar it already has); a calendar entry
+    replaces it. The days named become working days, added to the current ones
+    or, with replace_days, replacing them.
+    """
+    all_days = set()
+    found = {}  # (department, program) -> (days, hours)
+    for dept in departments:
+        days = [d.capitalize() for d in dept.get("workingDays", [])]
+        hours = [(h["start"], h["end"]) for h in dept.get("workingHours", [])]
+        all_days.update(days)
+        if days or hours:
+            key = (dept.get("name") or "Department", dept.get("program") or "Program")
+            if key not in found:
+                existing = generator.calendars.get(key)
+                found[key] = (set(existing.days), set(existing.hours)) if existing else (set(), set())
+            found[key][0].update(days)
+            found[key][1].update(hours)
+    for entry in calendars:
+        days = [d.capitalize() for d in entry.get("days", [])]
+        all_days.update(days)
+        found[(entry["department"], entry.get("program"))] = (
+            set(days), {(h["start"], h["end"]) for h in entry.get("hours", [])})
+
+    if all_days:
+        if not replace_days:
+            all_days.update(generator.days)
+        # Map to title case to match internal comparison (e.g., "Monday")
+        generator.days = [
+            day for day in ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"]
+            if day in all_days
+        ]
+    for (department, program), (days, hours) in found.items():
+        generator.set_calendar(department, days=[d for d in generator.days if d in days],
+                               hours=sorted(hours), program=program)
+
+
+def add_blackouts(generator: UniversityTimetableGenerator, entries: List[Dict]):
+    """Apply payload blackouts; an entry without day/days covers every working day"""
+    for blackout in entries:
+        kind, target = parse_blackout_target(blackout)
+        days = blackout.get("days") or ([blackout["day"]] if blackout.get("day") else generator.days)
+        for day in days:
+            generator.add_blackout(kind, target, day.capitalize(), blackout["start"], blackout["end"])
+
+
+def add_rooms(generator: UniversityTimetableGenerator, rooms_obj: Dict, replace: bool = False):
+    """Add payload rooms ({ general, labs, nb }); replace drops the existing rooms first"""
+    general_rooms = rooms_obj.get("general", []) + rooms_obj.get("nb", [])
+    lab_rooms = rooms_obj.get("labs", [])
+    if not (general_rooms or lab_rooms):
+        return
+
+    if replace:
+        generator.rooms = {}
+    for r in general_rooms:
+        parsed = parse_room_entry(r)
+        if parsed:
+            generator.add_custom_room(parsed[0], RoomType.CLASSROOM, parsed[1])
+    for r in lab_rooms:
+        parsed = parse_room_entry(r)
+        if parsed:
+            generator.add_custom_room(parsed[0], RoomType.LAB, parsed[1])
+
+
+def add_departments(generator: UniversityTimetableGenerator, departments: List[Dict],
+                    group_to_program: Dict[Tuple[int, str, str], str]):
+    """Add the courses of payload department entries, recording each group's program"""
+    for dept in departments:
+        department_name = dept.get("name") or "Department"
+        program_name = dept.get("program") or "Program"
+        semester = int(dept.get("semester"))
+        section = str(dept.get("section"))
+        section_enrollment = _positive_int(dept.get("enrolledStudents", DEFAULT_ENROLLMENT), "enrolledStudents")
+
+        group_to_program[(semester, section, department_name)] = program_name
+
+        for course in dept.get("courses", []):
+            credit_hours = _positive_int(course.get("creditHours", 3), "creditHours")
+            generator.add_course(
+                code=course.get("code", ""),
+                name=course.get("name", ""),
+                course_type=parse_course_type(course.get("type"), credit_hours),
+                credit_hours=credit_hours,
+                semester=semester,
+                section=section,
+                department=department_name,
+                teacher=course.get("teacher"),
+                enrolled_students=_positive_int(course.get("enrolledStudents", section_enrollment),
+                                                "enrolledStudents"),
+                program=program_name,
+                combine_key=parse_combine_key(course),
+            )
@@ -0,0 +1,38 @@
+"""
+Thread-safe bounded LRU map shared by the in-memory stores (timetable
+versions in delta.py, catalog templates in catalogs.py).
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class BoundedLRU:
+    """Dict-like store that drops the least recently used entry past capacity"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def pop(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            return self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
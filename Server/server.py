@@ -1,11 +1,18 @@
 
 
+import heapq
+import itertools
 import random
+import threading
+import time
+from bisect import bisect_left
 from datetime import datetime, timedelta
 from typing import List, Dict, Tuple, Optional
 import json
 from dataclasses import dataclass, asdict
 from enum import Enum
+
+from evaluator import ScheduleEvaluator
 try:
     import pandas as pd  # optional; only needed for Excel export
 except Exception:
@@ -25,6 +32,49 @@ class TimeSlot(Enum):
     MORNING = "morning"  # 8:00 AM - 3:00 PM for juniors
     EVENING = "evening"  # 2:30 PM - 9:30 PM for seniors
 
+# Room versions come from one process-wide counter so that forks of the same
+# generator never hand out the same version for different occupancy, which
+# lets them share one slot-search memo safely.
+_room_version_counter = itertools.count(1)
+
+# Orders in which generate_timetable can place sessions
+SCHEDULING_ORDERS = ("group", "global")
+
+# Resources that can be blacked out; group targets are (semester, section)
+BLACKOUT_KINDS = ("room", "teacher", "group")
+
+class CancellationToken:
+    """Set from any thread to make a running generate_timetable stop early"""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+
+class _GenerationStopped(Exception):
+    """Raised at a placement boundary once the deadline passes or the token is cancelled"""
+
+# Why a session could not be placed on a day, as recorded in unscheduled_report()
+UNSCHEDULED_REASONS = {
+    "no_suitable_room": "no room of the right type seats the enrollment",
+    "weekly_cap": "the section would exceed the weekly hours cap",
+    "window_too_short": "the working calendar leaves no window long enough",
+    "blackout": "a section or teacher blackout covers every fitting time",
+    "teacher_busy": "the teacher is booked or unavailable at every fitting time",
+    "section_busy": "the section already has class at every fitting time",
+    "rooms_busy": "every suitable room is booked whenever the section is free",
+}
+
+def _clock_minutes(hhmm: str) -> int:
+    hours, minutes = hhmm.split(":")
+    return int(hours) * 60 + int(minutes)
+
 # Data Classes for structured data
 @dataclass
 class Room:
@@ -43,6 +93,30 @@ class Course:
     department: str
     teacher: Optional[str] = None
     enrolled_students: int = 30
+    program: Optional[str] = None
+    # Courses with the same combine_key, type and teacher may share sessions
+    combine_key: Optional[str] = None
+
+@dataclass(frozen=True)
+class WorkingCalendar:
+    """Days and hour ranges a department (or one of its programs) can teach in
+
+    An empty days tuple means every generator day; empty hours means the
+    semester's default MORNING/EVENING window. A program calendar takes
+    whatever it leaves empty from its department's calendar, so days set per
+    program and hours set per department combine.
+    """
+    days: Tuple[str, ...] = ()
+    hours: Tuple[Tuple[str, str], ...] = ()
+
+@dataclass(frozen=True)
+class Blackout:
+    """A window in which a room, teacher or group cannot be booked"""
+    kind: str
+    target: object
+    day: str
+    start_time: str
+    end_time: str
 
 @dataclass
 class TimeSlotInfo:
@@ -59,6 +133,8 @@ class ScheduledClass:
 class UniversityTimetableGenerator:
     def __init__(self):
         self.rooms = self._initialize_rooms()
+        self._rooms_by_type = None
+        self._rooms_indexed = None  # the rooms dict _rooms_by_type was built from
         self.courses = []
         self.schedule = {}
         self.days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
@@ -66,6 +142,105 @@ class UniversityTimetableGenerator:
         self.end_time = datetime.strptime("21:30", "%H:%M")
         self.junior_end = datetime.strptime("15:00", "%H:%M")
         self.senior_start = datetime.strptime("14:30", "%H:%M")
+        self.max_weekly_hours = 35  # 7 hours/day * 5 days
+        self.slot_minutes = 30
+        self.evaluator = None
+
+        # (department, program or None) -> WorkingCalendar, compiled lazily
+        # into per-day bitmasks of allowed grid slots
+        self.calendars = {}
+        self._calendar_masks = {}
+
+        # id(course) -> why its missing sessions failed; see unscheduled_report()
+        self.unscheduled = {}
+
+        # Set by generate_timetable for the duration of one solve
+        self._deadline = None
+        self._cancel = None
+
+        # Combined lectures, planned at the start of every solve
+        self._lectures = {}      # id(lead course) -> member courses, lead first
+        self._lecture_lead = {}  # id(following member) -> lead course
+
+        # Unavailability windows, loaded into occupancy before every solve
+        self.blackouts = []
+        self._blackout_index = {}  # (kind, target, day) -> ((start, end) minutes, ...)
+
+        # Occupancy index: one bit per slot_minutes step from start_time
+        self._room_masks = {}     # (day, room) -> busy bits, blackouts included
+        self._group_masks = {}    # (day, semester, section) -> busy bits
+        self._group_blocked = {}  # (day, semester, section) -> blacked-out bits
+        self._teacher_masks = {}  # (day, teacher) -> busy bits, blackouts included
+        self._group_hours = {}    # (semester, section) -> scheduled hours
+
+        # Slot search memo; see _find_continuous_slot
+        self.memoize_slot_search = True
+        self._room_versions = {}  # (day, room) -> bumped on every booking
+        self._slot_memo = {}
+        self.slot_cache_hits = 0
+        self.slot_cache_misses = 0
+
+        # Copy-on-write bookkeeping for fork()/commit()
+        self._revision = 0
+        self._parent = None
+        self._parent_revision = 0
+        self._owned_schedule_keys = set()
+
+    def fork(self) -> "UniversityTimetableGenerator":
+        """Cheap independent copy of the current rooms, courses and schedule
+
+        Rooms, courses, scheduled classes and per-key schedule lists are shared
+        with the original; each side copies a schedule list only the first time
+        it changes it. Occupancy and evaluator entries are immutable values, so
+        only their top-level dicts are copied. The fork can later be folded back
+        with commit() or dropped with discard().
+        """
+        child = object.__new__(UniversityTimetableGenerator)
+        child._adopt_state(self)
+        child._parent = self
+        child._parent_revision = self._revision
+        return child
+
+    def commit(self):
+        """Make this fork's state the parent's state"""
+        parent = self._parent
+        if parent is None:
+            raise RuntimeError("Only a fork can be committed")
+        if parent._revision != self._parent_revision:
+            raise RuntimeError("Parent generator changed since it was forked")
+        parent._adopt_state(self)
+        parent._revision += 1
+        self._parent_revision = parent._revision
+
+    def discard(self):
+        """Detach this fork from its parent; its changes are simply dropped"""
+        self._parent = None
+
+    def _adopt_state(self, source: "UniversityTimetableGenerator"):
+        lineage = {name: getattr(self, name, default)
+                   for name, default in (("_parent", None), ("_parent_revision", 0), ("_revision", 0))}
+        for name, value in source.__dict__.items():
+            if isinstance(value, (dict, list)) and name != "_slot_memo":
+                value = value.copy()
+            setattr(self, name, value)
+        self.__dict__.update(lineage)
+        if source._rooms_indexed is source.rooms:
+            self._rooms_indexed = self.rooms  # the copied rooms still match the shared index
+        if source.evaluator is not None:
+            self.evaluator = source.evaluator.fork(self)
+
+        # Schedule lists are now shared by both sides; whoever writes first copies
+        self._owned_schedule_keys = set()
+        source._owned_schedule_keys = set()
+
+    def _owned_schedule_list(self, key: Tuple[str, int, str]) -> List[ScheduledClass]:
+        """Schedule list for key that this generator may mutate in place"""
+        classes = self.schedule.get(key)
+        if classes is None or key not in self._owned_schedule_keys:
+            classes = list(classes or [])
+            self.schedule[key] = classes
+            self._owned_schedule_keys.add(key)
+        return classes
 
     def _initialize_rooms(self) -> Dict[str, Room]:
         """Initialize default rooms based on requirements"""
@@ -92,10 +267,96 @@ class UniversityTimetableGenerator:
     def add_custom_room(self, room_id: str, room_type: RoomType, capacity: int = 50):
         """Add custom rooms to the system"""
         self.rooms[room_id] = Room(room_id, room_type, capacity)
+        self._rooms_by_type = None
+        self._revision += 1
+
+    def remove_room(self, room_id: str) -> int:
+        """Close a room and unschedule every session held in it
+
+        Returns the number of sessions dropped; the next generate_timetable()
+        call places them again in the remaining rooms.
+        """
+        self.rooms.pop(room_id, None)
+        self._rooms_by_type = None
+        self._revision += 1
+
+        dropped = 0
+        replacements = {}  # id(original class) -> class without the room, or None
+        for key in list(self.schedule):
+            classes = self.schedule[key]
+            if not any(slot.room == room_id for sc in classes for slot in sc.time_slots):
+                continue
+            kept = []
+            for scheduled_class in classes:
+                if id(scheduled_class) not in replacements:
+                    slots = [slot for slot in scheduled_class.time_slots if slot.room != room_id]
+                    dropped += len(scheduled_class.time_slots) - len(slots)
+                    if len(slots) == len(scheduled_class.time_slots):
+                        replacements[id(scheduled_class)] = scheduled_class
+                    else:
+                        replacements[id(scheduled_class)] = (
+                            ScheduledClass(course=scheduled_class.course, time_slots=slots) if slots else None)
+                replacement = replacements[id(scheduled_class)]
+                if replacement is not None and any(slot.day == key[0] for slot in replacement.time_slots):
+                    kept.append(replacement)
+            if kept:
+                self.schedule[key] = kept
+                self._owned_schedule_keys.add(key)
+            else:
+                del self.schedule[key]
+        return dropped
+
+    def set_calendar(self, department: str, days: Optional[List[str]] = None,
+                     hours: Optional[List[Tuple[str, str]]] = None, program: Optional[str] = None):
+        """Restrict a department, or one of its programs, to given days and hour ranges"""
+        self.calendars[(department, program)] = WorkingCalendar(
+            days=tuple(days or ()),
+            hours=tuple((start, end) for start, end in (hours or ())),
+        )
+        self._calendar_masks = {}
+        self._revision += 1
+
+    def add_blackout(self, kind: str, target, day: str, start: str, end: str):
+        """Make a room, teacher or (semester, section) group unavailable from start to end on day"""
+        if kind not in BLACKOUT_KINDS:
+            raise ValueError(f"Unknown blackout kind: {kind}")
+        if kind == "group":
+            target = tuple(target)
+        if datetime.strptime(end, "%H:%M") <= datetime.strptime(start, "%H:%M"):
+            raise ValueError(f"Blackout on {day} ends before it starts: {start}-{end}")
+        blackout = Blackout(kind, target, day, start, end)
+        self.blackouts.append(blackout)
+        key = (kind, target, day)
+        self._blackout_index[key] = self._blackout_index.get(key, ()) + (
+            (_clock_minutes(start), _clock_minutes(end)),)
+        self._revision += 1
+
+    def _blackout_intervals(self, kind: str, target, day: str) -> Tuple[Tuple[int, int], ...]:
+        """Blacked-out (start, end) minute intervals for one resource and day"""
+        return self._blackout_index.get((kind, target, day), ())
+
+    def configure_time_grid(self, start: str = "08:00", end: str = "21:30", slot_minutes: int = 30):
+        """Set the day's bounds and the resolution that start times snap to"""
+        if slot_minutes <= 0:
+            raise ValueError("slot_minutes must be positive")
+        for course_type in CourseType:
+            if int(self._get_class_duration(course_type) * 60) % slot_minutes:
+                raise ValueError(f"{slot_minutes}-minute grid cannot fit {course_type.value} classes")
+        start_time = datetime.strptime(start, "%H:%M")
+        end_time = datetime.strptime(end, "%H:%M")
+        if end_time <= start_time:
+            raise ValueError(f"Time grid end {end} must be after its start {start}")
+        self.start_time = start_time
+        self.end_time = end_time
+        self.slot_minutes = slot_minutes
+        self._calendar_masks = {}
+        self._revision += 1
 
     def add_course(self, code: str, name: str, course_type: CourseType,
                    credit_hours: int, semester: int, section: str,
-                   department: str, teacher: Optional[str] = None):
+                   department: str, teacher: Optional[str] = None,
+                   enrolled_students: int = 30, program: Optional[str] = None,
+                   combine_key: Optional[str] = None):
         """Add a course to the system"""
         course = Course(
             code=code,
@@ -105,14 +366,65 @@ class UniversityTimetableGenerator:
             semester=semester,
             section=section,
             department=department,
-            teacher=teacher
+            teacher=teacher,
+            enrolled_students=enrolled_students,
+            program=program,
+            combine_key=combine_key
         )
         self.courses.append(course)
+        self._revision += 1
+
+    def remove_courses(self, code: str, semester: Optional[int] = None, section: Optional[str] = None,
+                       department: Optional[str] = None) -> int:
+        """Drop the courses matching code (and any given group fields) with their sessions
+
+        Returns the number of courses removed.
+        """
+        def matches(course: Course) -> bool:
+            return (course.code == code
+                    and semester in (None, course.semester)
+                    and section in (None, course.section)
+                    and department in (None, course.department))
+
+        removed = [course for course in self.courses if matches(course)]
+        if not removed:
+            return 0
+        self.courses = [course for course in self.courses if not matches(course)]
+        self._revision += 1
+
+        gone = {id(course) for course in removed}
+        for key in list(self.schedule):
+            classes = self.schedule[key]
+            kept = [sc for sc in classes if id(sc.course) not in gone]
+            if kept and len(kept) != len(classes):
+                self.schedule[key] = kept
+                self._owned_schedule_keys.add(key)
+            elif not kept:
+                del self.schedule[key]
+        return len(removed)
+
+    def _build_room_index(self) -> Dict[RoomType, Tuple[List[int], Tuple[str, ...]]]:
+        """Index rooms by type, sorted by capacity (smallest first)"""
+        grouped = {}
+        for room in self.rooms.values():
+            grouped.setdefault(room.room_type, []).append(room)
+
+        index = {}
+        for room_type, rooms in grouped.items():
+            rooms.sort(key=lambda r: (r.capacity, r.id))
+            index[room_type] = ([r.capacity for r in rooms], tuple(r.id for r in rooms))
+        return index
 
     def _get_time_slot_category(self, semester: int) -> TimeSlot:
         """Determine if a semester is junior or senior"""
         return TimeSlot.MORNING if semester <= 4 else TimeSlot.EVENING
 
+    def _get_search_window(self, semester: int) -> Tuple[datetime, datetime]:
+        """Earliest start and latest end allowed for a semester's classes"""
+        if self._get_time_slot_category(semester) == TimeSlot.MORNING:
+            return self.start_time, self.junior_end
+        return self.senior_start, self.end_time
+
     def _get_class_duration(self, course_type: CourseType) -> float:
         """Get class duration in hours based on course type"""
         durations = {
@@ -131,112 +443,513 @@ class UniversityTimetableGenerator:
         }
         return classes[course_type]
 
-    def _get_suitable_rooms(self, course: Course) -> List[str]:
-        """Get suitable rooms for a course based on type"""
-        if course.course_type == CourseType.LAB:
-            return [r for r, room in self.rooms.items() if room.room_type == RoomType.LAB]
-        else:
-            return [r for r, room in self.rooms.items() if room.room_type == RoomType.CLASSROOM]
-
-    def _is_time_slot_available(self, day: str, start: datetime, end: datetime,
-                                room: str, semester: int, section: str) -> bool:
-        """Check if a time slot is available"""
-        key = (day, semester, section)
-
-        # Check room availability
-        for scheduled_day, scheduled_classes in self.schedule.items():
-            if scheduled_day[0] != day:
+    def _get_room_type(self, course: Course) -> RoomType:
+        """Labs need lab rooms; everything else goes in a classroom"""
+        return RoomType.LAB if course.course_type == CourseType.LAB else RoomType.CLASSROOM
+
+    def _room_index(self) -> Dict[RoomType, Tuple[List[int], Tuple[str, ...]]]:
+        """Rooms by type and capacity; rebuilt after rooms are added, removed or replaced"""
+        if self._rooms_by_type is None or self._rooms_indexed is not self.rooms:
+            self._rooms_by_type = self._build_room_index()
+            self._rooms_indexed = self.rooms
+        return self._rooms_by_type
+
+    def _get_suitable_rooms(self, course: Course) -> Tuple[str, ...]:
+        """Get rooms of the right type that can seat the course, best fit first"""
+        capacities, room_ids = self._room_index().get(self._get_room_type(course), ([], ()))
+
+        # Smallest room that fits the whole lecture comes first; larger rooms are the fallback
+        seats = sum(member.enrolled_students for member in self._lectures.get(id(course), (course,)))
+        first_fit = bisect_left(capacities, seats)
+        return room_ids[first_fit:]
+
+    @staticmethod
+    def _lecture_tag(course: Course) -> Optional[Tuple]:
+        """Identity shared by the sessions of one combined lecture; None if not combinable"""
+        if course.combine_key is None:
+            return None
+        return (course.combine_key, course.course_type, course.teacher)
+
+    def _plan_lectures(self, existing_days: Dict[int, List[str]]):
+        """Pack combinable courses into shared lectures
+
+        Courses with the same lecture tag, calendar and sessions already placed
+        join the first lecture that still fits the largest suitable room; a
+        course whose calendar differs from every lecture's is scheduled on its
+        own. The first member leads: its placements are copied to every other
+        member.
+        """
+        self._lectures = {}
+        self._lecture_lead = {}
+
+        open_lectures = {}
+        for course in self.courses:
+            tag = self._lecture_tag(course)
+            if tag is None:
                 continue
-            for scheduled_class in scheduled_classes:
+            capacities, _ = self._room_index().get(self._get_room_type(course), ([], ()))
+            largest = capacities[-1] if capacities else 0
+            key = (tag, tuple(self._allowed_masks(course).values()),
+                   tuple(sorted(existing_days.get(id(course), []))))
+            lectures = open_lectures.setdefault(key, [])
+            for members in lectures:
+                if sum(member.enrolled_students for member in members) + course.enrolled_students <= largest:
+                    members.append(course)
+                    break
+            else:
+                lectures.append([course])
+
+        for lectures in open_lectures.values():
+            for members in lectures:
+                if len(members) > 1:
+                    self._lectures[id(members[0])] = tuple(members)
+                    for member in members[1:]:
+                        self._lecture_lead[id(member)] = members[0]
+
+    def _slot_index(self, moment: datetime) -> int:
+        """Grid position of a time of day, counted in slot_minutes from start_time"""
+        return int((moment - self.start_time).total_seconds() // 60) // self.slot_minutes
+
+    def _slot_time(self, index: int) -> datetime:
+        return self.start_time + timedelta(minutes=index * self.slot_minutes)
+
+    def _clock_time(self, minutes: int) -> datetime:
+        """Time of day minutes after midnight, on the same date as start_time"""
+        return self.start_time.replace(hour=0, minute=0) + timedelta(minutes=minutes)
+
+    def _slot_width(self, duration: float) -> int:
+        return int(duration * 60) // self.slot_minutes
+
+    def _interval_mask(self, start: datetime, end: datetime) -> int:
+        first, last = self._slot_index(start), self._slot_index(end)
+        return ((1 << (last - first)) - 1) << first
+
+    def _range_mask(self, start: datetime, end: datetime) -> int:
+        """Grid slots lying entirely inside [start, end), clipped to the day"""
+        grid_slots = self._slot_index(self.end_time)
+        offset = (start - self.start_time).total_seconds() / 60
+        first = max(0, -int(-offset // self.slot_minutes))  # round up
+        last = min(grid_slots, self._slot_index(end))
+        if last <= first:
+            return 0
+        return ((1 << (last - first)) - 1) << first
+
+    def _cover_mask(self, start: datetime, end: datetime) -> int:
+        """Grid slots touching [start, end), clipped to the day"""
+        grid_slots = self._slot_index(self.end_time)
+        offset = (end - self.start_time).total_seconds() / 60
+        first = max(0, self._slot_index(start))
+        last = min(grid_slots, -int(-offset // self.slot_minutes))  # round up
+        if last <= first:
+            return 0
+        return ((1 << (last - first)) - 1) << first
+
+    def _effective_calendar(self, course: Course) -> Optional[WorkingCalendar]:
+        """The course's program calendar, with empty days or hours filled from its department's"""
+        program = self.calendars.get((course.department, course.program))
+        department = self.calendars.get((course.department, None))
+        if program is None or department is None:
+            return program or department
+        return WorkingCalendar(days=program.days or department.days, hours=program.hours or department.hours)
+
+    def _allowed_masks(self, course: Course) -> Dict[str, int]:
+        """Per-day bitmask of grid slots the course may use
+
+        Combines the department/program calendar (or the semester's default
+        MORNING/EVENING window) into one precompiled mask per day, so search
+        and availability checks apply it with a single AND.
+        """
+        calendar = self._effective_calendar(course)
+        category = self._get_time_slot_category(course.semester)
+        key = (calendar, category)
+        masks = self._calendar_masks.get(key)
+        if masks is not None:
+            return masks
+
+        if calendar is not None and calendar.hours:
+            hours_mask = 0
+            for start, end in calendar.hours:
+                hours_mask |= self._range_mask(datetime.strptime(start, "%H:%M"),
+                                               datetime.strptime(end, "%H:%M"))
+        else:
+            hours_mask = self._range_mask(*self._get_search_window(course.semester))
+
+        allowed_days = set(calendar.days) if calendar is not None and calendar.days else set(self.days)
+        masks = {day: hours_mask if day in allowed_days else 0 for day in self.days}
+        self._calendar_masks[key] = masks
+        return masks
+
+    def _calendar_allows(self, course: Course, day: str, start_minute: int, end_minute: int) -> bool:
+        """Whether [start_minute, end_minute) on day is inside the course's calendar"""
+        offset = start_minute - (self.start_time.hour * 60 + self.start_time.minute)
+        length = end_minute - start_minute
+        if offset < 0 or offset % self.slot_minutes or length % self.slot_minutes:
+            return False
+        mask = ((1 << (length // self.slot_minutes)) - 1) << (offset // self.slot_minutes)
+        return not mask & ~self._allowed_masks(course).get(day, 0)
+
+    def _session_allowed(self, course: Course, day: str) -> int:
+        """Calendar bits for the course on day minus teacher and group unavailability"""
+        allowed = self._allowed_masks(course)[day]
+        if allowed:
+            allowed &= ~self._group_blocked.get((day, course.semester, course.section), 0)
+            if course.teacher:
+                allowed &= ~self._teacher_masks.get((day, course.teacher), 0)
+        return allowed
+
+    def _reset_occupancy(self):
+        """Rebuild the occupancy index from whatever is already in the schedule"""
+        self._room_masks = {}
+        self._group_masks = {}
+        self._group_blocked = {}
+        self._teacher_masks = {}
+        self._group_hours = {}
+        self._room_versions = {}
+        self._slot_memo = {}
+        self.slot_cache_hits = 0
+        self.slot_cache_misses = 0
+
+        # Blackouts become plain busy bits, so search never has to look at them
+        for blackout in self.blackouts:
+            mask = self._cover_mask(datetime.strptime(blackout.start_time, "%H:%M"),
+                                    datetime.strptime(blackout.end_time, "%H:%M"))
+            if blackout.kind == "room":
+                key = (blackout.day, blackout.target)
+                self._room_masks[key] = self._room_masks.get(key, 0) | mask
+                self._room_versions[key] = next(_room_version_counter)
+            elif blackout.kind == "teacher":
+                key = (blackout.day, blackout.target)
+                self._teacher_masks[key] = self._teacher_masks.get(key, 0) | mask
+            else:
+                key = (blackout.day,) + blackout.target
+                self._group_blocked[key] = self._group_blocked.get(key, 0) | mask
+
+        seen = set()
+        shared = set()  # combined sessions already counted towards a group's hours
+        for classes in self.schedule.values():
+            for scheduled_class in classes:
+                if id(scheduled_class) in seen:
+                    continue
+                seen.add(id(scheduled_class))
+                course = scheduled_class.course
+                tag = self._lecture_tag(course)
                 for slot in scheduled_class.time_slots:
-                    if slot.room != room or slot.day != day:
-                        continue
-                    slot_start = datetime.strptime(slot.start_time, "%H:%M")
-                    slot_end = datetime.strptime(slot.end_time, "%H:%M")
-
-                    # Check for overlap
-                    if not (end <= slot_start or start >= slot_end):
-                        return False
+                    key = (tag, course.semester, course.section, slot.day, slot.start_time, slot.room)
+                    self._book(course, slot, count_hours=tag is None or key not in shared)
+                    if tag is not None:
+                        shared.add(key)
+
+    def _book(self, course: Course, slot: TimeSlotInfo, count_hours: bool = True):
+        """Mark a session's room, group and teacher as busy"""
+        mask = self._interval_mask(datetime.strptime(slot.start_time, "%H:%M"),
+                                   datetime.strptime(slot.end_time, "%H:%M"))
+        room_key = (slot.day, slot.room)
+        group_key = (slot.day, course.semester, course.section)
+        self._room_masks[room_key] = self._room_masks.get(room_key, 0) | mask
+        self._room_versions[room_key] = next(_room_version_counter)
+        self._group_masks[group_key] = self._group_masks.get(group_key, 0) | mask
+        if course.teacher:
+            teacher_key = (slot.day, course.teacher)
+            self._teacher_masks[teacher_key] = self._teacher_masks.get(teacher_key, 0) | mask
+
+        if count_hours:
+            group = (course.semester, course.section)
+            self._group_hours[group] = self._group_hours.get(group, 0) + self._get_class_duration(course.course_type)
 
-        # Check if the section has classes at this time
-        if key in self.schedule:
-            for scheduled_class in self.schedule[key]:
-                for slot in scheduled_class.time_slots:
-                    slot_start = datetime.strptime(slot.start_time, "%H:%M")
-                    slot_end = datetime.strptime(slot.end_time, "%H:%M")
+    def _find_continuous_slot(self, day: str, duration: float, semester: int,
+                             section: str, suitable_rooms: Tuple[str, ...],
+                             allowed: int) -> Optional[Tuple[datetime, str]]:
+        """Find a continuous time slot for a class, reusing earlier answers when still valid
+
+        allowed is the course's calendar mask for the day (see _allowed_masks).
+        Answers are memoized by (day, duration, allowed, room pool, group's busy
+        bits for the day). Keying on the group's occupancy rather than its name
+        means the group dependency is checked by value, and sibling sections in
+        the same state share entries. Each entry also records the version of
+        every (day, room) in the pool; a booking bumps only that room's version,
+        so an entry is recomputed only when one of its own rooms has changed.
+        """
+        if not self.memoize_slot_search:
+            return self._search_continuous_slot(day, duration, semester, section, suitable_rooms, allowed)
+
+        key = (day, duration, allowed, suitable_rooms, self._group_masks.get((day, semester, section), 0))
+        versions = tuple(self._room_versions.get((day, room), 0) for room in suitable_rooms)
+
+        cached = self._slot_memo.get(key)
+        if cached is not None and cached[0] == versions:
+            self.slot_cache_hits += 1
+            return cached[1]
+
+        self.slot_cache_misses += 1
+        answer = self._search_continuous_slot(day, duration, semester, section, suitable_rooms, allowed)
+        self._slot_memo[key] = (versions, answer)
+        return answer
+
+    def slot_cache_stats(self) -> Dict:
+        lookups = self.slot_cache_hits + self.slot_cache_misses
+        return {
+            "hits": self.slot_cache_hits,
+            "misses": self.slot_cache_misses,
+            "hitRate": round(self.slot_cache_hits / lookups, 4) if lookups else 0.0,
+        }
 
-                    if not (end <= slot_start or start >= slot_end):
-                        return False
+    def _search_continuous_slot(self, day: str, duration: float, semester: int,
+                                section: str, suitable_rooms: Tuple[str, ...],
+                                allowed: int) -> Optional[Tuple[datetime, str]]:
+        """Find a continuous time slot for a class
 
-        return True
+        Only start positions where the group is free and the calendar allows
+        the whole session are visited; disallowed times are never probed.
+        """
+        width = self._slot_width(duration)
+        group_busy = self._group_masks.get((day, semester, section), 0)
+        starts = self._candidate_starts(allowed & ~group_busy, width)
+        if not starts:
+            return None
 
-    def _get_day_schedule_for_section(self, day: str, semester: int, section: str) -> List[Tuple[datetime, datetime]]:
-        """Get all scheduled times for a section on a specific day"""
-        key = (day, semester, section)
-        scheduled_times = []
+        # Try to schedule right after the last class (no gaps)
+        if group_busy:
+            after_last = group_busy.bit_length()
+            if starts >> after_last & 1:
+                room = self._first_free_room(day, after_last, width, suitable_rooms)
+                if room:
+                    return (self._slot_time(after_last), room)
+
+        # Otherwise take the earliest start with a free room
+        while starts:
+            index = (starts & -starts).bit_length() - 1
+            room = self._first_free_room(day, index, width, suitable_rooms)
+            if room:
+                return (self._slot_time(index), room)
+            starts &= starts - 1
 
-        if key in self.schedule:
-            for scheduled_class in self.schedule[key]:
-                for slot in scheduled_class.time_slots:
-                    if slot.day == day:
-                        start = datetime.strptime(slot.start_time, "%H:%M")
-                        end = datetime.strptime(slot.end_time, "%H:%M")
-                        scheduled_times.append((start, end))
+        return None
 
-        return sorted(scheduled_times, key=lambda x: x[0])
+    @staticmethod
+    def _candidate_starts(free: int, width: int) -> int:
+        """Bits i such that slots i .. i + width - 1 are all set in free"""
+        starts = free
+        for offset in range(1, width):
+            starts &= free >> offset
+        return starts
+
+    def _first_free_room(self, day: str, index: int, width: int,
+                         suitable_rooms: Tuple[str, ...]) -> Optional[str]:
+        mask = ((1 << width) - 1) << index
+        for room in suitable_rooms:
+            if not self._room_masks.get((day, room), 0) & mask:
+                return room
+        return None
 
-    def _find_continuous_slot(self, day: str, duration: float, semester: int,
-                             section: str, suitable_rooms: List[str]) -> Optional[Tuple[datetime, str]]:
-        """Find a continuous time slot for a class"""
-        slot_category = self._get_time_slot_category(semester)
+    def _next_session_slot(self, course: Course, days_used: List[str],
+                           suitable_rooms: Tuple[str, ...],
+                           reasons: Optional[Dict[str, str]] = None) -> Optional[TimeSlotInfo]:
+        """Find the earliest day and slot for one more session of a course
 
-        if slot_category == TimeSlot.MORNING:
-            search_start = self.start_time
-            search_end = self.junior_end
-        else:
-            search_start = self.senior_start
-            search_end = self.end_time
+        For the lead of a combined lecture the slot must suit every member: all
+        member groups free, within every member's calendar and weekly cap.
+        If reasons is given, each rejected day's UNSCHEDULED_REASONS key is
+        stored in it; the diagnosis only runs for days that fail.
+        """
+        duration = self._get_class_duration(course.course_type)
+        members = self._lectures.get(id(course), (course,))
+        groups = {(member.semester, member.section) for member in members}
 
-        # Get existing schedule for this section
-        existing_schedule = self._get_day_schedule_for_section(day, semester, section)
+        for day in self.days:
+            if day in days_used:
+                continue
 
-        # Try to schedule right after the last class (no gaps)
-        if existing_schedule:
-            last_end = existing_schedule[-1][1]
-            potential_start = last_end
-            potential_end = last_end + timedelta(hours=duration)
+            # Check weekly hours limit
+            if any(self._group_hours.get(group, 0) + duration > self.max_weekly_hours for group in groups):
+                if reasons is not None:
+                    reasons[day] = "weekly_cap"
+                continue
 
-            if potential_end <= search_end:
-                for room in suitable_rooms:
-                    if self._is_time_slot_available(day, potential_start, potential_end, room, semester, section):
-                        return (potential_start, room)
+            allowed = self._session_allowed(course, day)
+            for member in members[1:]:
+                if not allowed:
+                    break
+                allowed &= (self._session_allowed(member, day)
+                            & ~self._group_masks.get((day, member.semester, member.section), 0))
+            slot_info = None
+            if allowed:
+                slot_info = self._find_continuous_slot(day, duration, course.semester,
+                                                       course.section, suitable_rooms, allowed)
+            if slot_info is None:
+                if reasons is not None:
+                    reasons[day] = self._diagnose_day(members, day, duration, suitable_rooms)
+                continue
 
-        # If no existing schedule or can't add after last class, start from beginning
-        current_time = search_start
-        while current_time + timedelta(hours=duration) <= search_end:
-            potential_end = current_time + timedelta(hours=duration)
+            start_time, room = slot_info
+            end_time = start_time + timedelta(hours=duration)
+            return TimeSlotInfo(
+                day=day,
+                start_time=start_time.strftime("%H:%M"),
+                end_time=end_time.strftime("%H:%M"),
+                room=room
+            )
+        return None
 
-            for room in suitable_rooms:
-                if self._is_time_slot_available(day, current_time, potential_end, room, semester, section):
-                    return (current_time, room)
+    def _diagnose_day(self, members: Tuple[Course, ...], day: str, duration: float,
+                      suitable_rooms: Tuple[str, ...]) -> str:
+        """First constraint, in order of UNSCHEDULED_REASONS, that rules out every start on day"""
+        if not suitable_rooms:
+            return "no_suitable_room"
+        width = self._slot_width(duration)
+        free = -1
+        for member in members:
+            free &= self._allowed_masks(member)[day]
+        if not self._candidate_starts(free, width):
+            return "window_too_short"
+        teacher = members[0].teacher
+        for member in members:
+            free &= ~self._group_blocked.get((day, member.semester, member.section), 0)
+        if teacher:
+            for start, end in self._blackout_intervals("teacher", teacher, day):
+                free &= ~self._cover_mask(self._clock_time(start), self._clock_time(end))
+        if not self._candidate_starts(free, width):
+            return "blackout"
+        if teacher:
+            free &= ~self._teacher_masks.get((day, teacher), 0)
+            if not self._candidate_starts(free, width):
+                return "teacher_busy"
+        for member in members:
+            free &= ~self._group_masks.get((day, member.semester, member.section), 0)
+        if not self._candidate_starts(free, width):
+            return "section_busy"
+        return "rooms_busy"
+
+    def _record_unscheduled(self, course: Course, reasons: Dict[str, str]):
+        """Note one session of course (and of its lecture's members) that could not be placed"""
+        print(f"Warning: Could not schedule {course.code} - {course.name}")
+        for member in self._lectures.get(id(course), (course,)):
+            entry = self.unscheduled.setdefault(id(member), {"course": member, "missing": 0, "reasons": {}})
+            entry["missing"] += 1
+            entry["reasons"].update(reasons)
+
+    def unscheduled_report(self) -> Dict:
+        """Courses with missing sessions and, per day, why they could not be placed"""
+        courses = []
+        reason_counts = {}
+        for entry in self.unscheduled.values():
+            course = entry["course"]
+            reasons = {day: entry["reasons"][day] for day in self.days if day in entry["reasons"]}
+            for reason in reasons.values():
+                reason_counts[reason] = reason_counts.get(reason, 0) + 1
+            courses.append({
+                "code": course.code,
+                "name": course.name,
+                "department": course.department,
+                "program": course.program,
+                "semester": course.semester,
+                "section": course.section,
+                "teacher": course.teacher,
+                "missingSessions": entry["missing"],
+                "reasons": reasons,
+            })
+        return {
+            "courses": courses,
+            "reasonCounts": reason_counts,
+            "reasonDescriptions": {reason: UNSCHEDULED_REASONS[reason] for reason in reason_counts},
+        }
 
-            current_time += timedelta(minutes=30)
+    def _commit_session(self, course: Course, time_slot: TimeSlotInfo,
+                        scheduled: Dict[int, ScheduledClass]):
+        """Record a placed session in the schedule, occupancy index and evaluator
+
+        A combined lecture's session is recorded for every member; room and
+        teacher are booked once, each member group's hours counted once.
+        """
+        counted_groups = set()
+        for member in self._lectures.get(id(course), (course,)):
+            scheduled_class = scheduled.get(id(member))
+            if scheduled_class is None:
+                scheduled_class = ScheduledClass(course=member, time_slots=[])
+                scheduled[id(member)] = scheduled_class
+            scheduled_class.time_slots.append(time_slot)
+
+            classes = self._owned_schedule_list((time_slot.day, member.semester, member.section))
+            if not any(c is scheduled_class for c in classes):
+                classes.append(scheduled_class)
+
+            group = (member.semester, member.section)
+            self._book(member, time_slot, count_hours=group not in counted_groups)
+            counted_groups.add(group)
+            self.evaluator.add_session(member, time_slot)
+        self._revision += 1
+
+    def generate_timetable(self, ordering: str = "group", deadline: Optional[float] = None,
+                           cancel: Optional[CancellationToken] = None) -> Dict:
+        """Generate the complete timetable
+
+        ordering="group" finishes each (semester, section) group before starting
+        the next. ordering="global" places every session of every group from one
+        queue ordered by resource scarcity: labs first, then longer sessions,
+        ties broken by how few feasible slots are left.
+
+        Sessions already in the schedule (e.g. on a fork of a solved generator)
+        are kept; only the missing ones are placed. Combinable courses are
+        packed into shared lectures first (see _plan_lectures).
+
+        deadline (a time.monotonic() value) and cancel are checked before every
+        placement. When either stops the solve, the sessions placed so far are
+        kept and the summary has partial=True and the stopReason.
+        """
+        # Days or the grid may have changed since calendars were compiled
+        self._calendar_masks = {}
+        self._reset_occupancy()
+        self.evaluator = ScheduleEvaluator(self)
+
+        if ordering not in SCHEDULING_ORDERS:
+            raise ValueError(f"Unknown ordering: {ordering}")
+        self._revision += 1
+        existing_days = self._scheduled_days_by_course()
+        self._plan_lectures(existing_days)
+        self.unscheduled = {}
+
+        self._deadline, self._cancel = deadline, cancel
+        stop_reason = None
+        try:
+            if ordering == "global":
+                self._schedule_globally(existing_days)
+            else:
+                self._schedule_by_group(existing_days)
+        except _GenerationStopped as stopped:
+            stop_reason = str(stopped)
+            print(f"Warning: Generation stopped early ({stop_reason})")
+        finally:
+            self._deadline, self._cancel = None, None
+
+        summary = self.evaluator.summary()
+        summary["partial"] = stop_reason is not None
+        summary["stopReason"] = stop_reason
+        return summary
+
+    def _check_stop(self):
+        """Placement boundary: stop if the caller's deadline passed or it cancelled"""
+        if self._cancel is not None and self._cancel.cancelled:
+            raise _GenerationStopped("cancelled")
+        if self._deadline is not None and time.monotonic() >= self._deadline:
+            raise _GenerationStopped("deadline")
+
+    def _scheduled_days_by_course(self) -> Dict[int, List[str]]:
+        """Days each course already has a session on, keyed by id(course)"""
+        days = {}
+        seen = set()
+        for classes in self.schedule.values():
+            for scheduled_class in classes:
+                if id(scheduled_class) in seen:
+                    continue
+                seen.add(id(scheduled_class))
+                days.setdefault(id(scheduled_class.course), []).extend(
+                    slot.day for slot in scheduled_class.time_slots)
+        return days
 
-        return None
+    def _scarcity_rank(self, course: Course) -> Tuple[bool, float]:
+        """Labs first (longer duration), then by session length"""
+        return (course.course_type != CourseType.LAB, -self._get_class_duration(course.course_type))
 
-    def _calculate_weekly_hours(self, semester: int, section: str) -> float:
-        """Calculate total weekly hours for a semester/section"""
-        total_hours = 0
-        for day in self.days:
-            key = (day, semester, section)
-            if key in self.schedule:
-                for scheduled_class in self.schedule[key]:
-                    duration = self._get_class_duration(scheduled_class.course.course_type)
-                    total_hours += duration
-        return total_hours
-
-    def generate_timetable(self) -> Dict:
-        """Generate the complete timetable"""
+    def _schedule_by_group(self, existing_days: Dict[int, List[str]]):
         # Group courses by semester and section
         courses_by_group = {}
         for course in self.courses:
@@ -247,59 +960,181 @@ class UniversityTimetableGenerator:
 
         # Sort courses: Labs first (longer duration), then by credit hours
         for key in courses_by_group:
-            courses_by_group[key].sort(key=lambda c: (
-                c.course_type != CourseType.LAB,
-                -self._get_class_duration(c.course_type)
-            ))
+            courses_by_group[key].sort(key=self._scarcity_rank)
 
         # Schedule each group
-        for (semester, section), group_courses in courses_by_group.items():
+        scheduled = {}
+        for group_courses in courses_by_group.values():
             for course in group_courses:
-                duration = self._get_class_duration(course.course_type)
+                if id(course) in self._lecture_lead:
+                    continue  # placed together with its lecture's lead
                 classes_per_week = self._get_classes_per_week(course.course_type)
                 suitable_rooms = self._get_suitable_rooms(course)
+                days_used = list(existing_days.get(id(course), []))
+
+                for _ in range(classes_per_week - len(days_used)):
+                    self._check_stop()
+                    reasons = {}
+                    time_slot = self._next_session_slot(course, days_used, suitable_rooms, reasons)
+                    if time_slot is None:
+                        self._record_unscheduled(course, reasons)
+                        continue
+                    days_used.append(time_slot.day)
+                    self._commit_session(course, time_slot, scheduled)
+
+    def _count_feasible_starts(self, day: str, duration: float, semester: int,
+                               section: str, suitable_rooms: Tuple[str, ...], allowed: int,
+                               room_starts: Optional[Dict] = None) -> int:
+        """Number of start times on a day where the group and at least one room are free
+
+        room_starts caches _pool_starts() per (room pool, width); the caller
+        must refresh it whenever a room on this day is booked.
+        """
+        width = self._slot_width(duration)
+        group_busy = self._group_masks.get((day, semester, section), 0)
+        starts = self._candidate_starts(allowed & ~group_busy, width)
+        if not starts:
+            return 0
+
+        any_room = room_starts.get((suitable_rooms, width)) if room_starts is not None else None
+        if any_room is None:
+            any_room = self._pool_starts(day, suitable_rooms, width)
+            if room_starts is not None:
+                room_starts[(suitable_rooms, width)] = any_room
+        return bin(starts & any_room).count("1")
+
+    def _pool_starts(self, day: str, suitable_rooms: Tuple[str, ...], width: int) -> int:
+        """Start bits on a day where at least one of the rooms is free for width slots"""
+        any_room = 0
+        for room in suitable_rooms:
+            any_room |= self._candidate_starts(~self._room_masks.get((day, room), 0), width)
+        return any_room
+
+    def _schedule_globally(self, existing_days: Dict[int, List[str]]):
+        """Place all sessions from one institution-wide queue
+
+        Courses that share a group, duration, room pool, calendar and teacher
+        have identical feasibility, so counts are kept per such demand class and
+        per day. After each placement only the classes touching the booked
+        group or teacher are recounted, plus those whose room pool lost its last
+        free room at some start, and only for the day that changed. Within a
+        tier the course with the fewest slots left comes off a heap; entries
+        whose count has since changed are skipped when popped.
+        """
+        pending = {}          # id(course) -> sessions still to place
+        days_used = {}        # id(course) -> days already taken by the course
+        demand_class = {}     # id(course) -> demand class key
+        rooms_for = {}        # demand class key -> suitable rooms
+        sample = {}           # demand class key -> one of its courses
+        members = {}          # demand class key -> its courses
+        feasible = {}         # demand class key -> {day: feasible start count}
+        by_group = {}         # (semester, section) -> demand class keys
+        by_pool = {}          # (room pool, width) -> demand class keys
+        pools_by_room = {}    # room id -> (room pool, width) keys containing it
+        by_teacher = {}       # teacher -> demand class keys
+        room_starts = {day: {} for day in self.days}  # see _count_feasible_starts
 
-                time_slots = []
-                days_used = []
-
-                for _ in range(classes_per_week):
-                    scheduled = False
-                    for day in self.days:
-                        if day in days_used and classes_per_week > 1:
-                            continue
-
-                        # Check weekly hours limit
-                        current_hours = self._calculate_weekly_hours(semester, section)
-                        if current_hours + duration > 35:  # 7 hours/day * 5 days
-                            continue
-
-                        slot_info = self._find_continuous_slot(day, duration, semester,
-                                                              section, suitable_rooms)
-                        if slot_info:
-                            start_time, room = slot_info
-                            end_time = start_time + timedelta(hours=duration)
-
-                            time_slot = TimeSlotInfo(
-                                day=day,
-                                start_time=start_time.strftime("%H:%M"),
-                                end_time=end_time.strftime("%H:%M"),
-                                room=room
-                            )
-                            time_slots.append(time_slot)
-                            days_used.append(day)
-                            scheduled = True
-                            break
-
-                    if not scheduled:
-                        print(f"Warning: Could not schedule {course.code} - {course.name}")
-
-                if time_slots:
-                    scheduled_class = ScheduledClass(course=course, time_slots=time_slots)
-                    for slot in time_slots:
-                        key = (slot.day, semester, section)
-                        if key not in self.schedule:
-                            self.schedule[key] = []
-                        self.schedule[key].append(scheduled_class)
+        for course in self.courses:
+            if id(course) in self._lecture_lead:
+                continue  # placed together with its lecture's lead
+            suitable_rooms = self._get_suitable_rooms(course)
+            duration = self._get_class_duration(course.course_type)
+            calendar = tuple(self._allowed_masks(course).values())
+            key = (course.semester, course.section, duration, suitable_rooms, calendar, course.teacher)
+            days_used[id(course)] = list(existing_days.get(id(course), []))
+            pending[id(course)] = self._get_classes_per_week(course.course_type) - len(days_used[id(course)])
+            demand_class[id(course)] = key
+            members.setdefault(key, []).append(course)
+            if key not in rooms_for:
+                rooms_for[key] = suitable_rooms
+                sample[key] = course
+                feasible[key] = {
+                    day: self._count_feasible_starts(day, duration, course.semester, course.section,
+                                                     suitable_rooms, self._session_allowed(course, day),
+                                                     room_starts[day])
+                    for day in self.days
+                }
+                by_group.setdefault((course.semester, course.section), set()).add(key)
+                pool = (suitable_rooms, self._slot_width(duration))
+                by_pool.setdefault(pool, set()).add(key)
+                for room in suitable_rooms:
+                    pools_by_room.setdefault(room, set()).add(pool)
+                if course.teacher:
+                    by_teacher.setdefault(course.teacher, set()).add(key)
+
+        # Scarcity tiers (labs, then long sessions); within a tier pick the
+        # course with the fewest feasible slots left
+        tiers = {}
+        for order, course in enumerate(self.courses):
+            if pending.get(id(course), 0) <= 0:
+                continue
+            tiers.setdefault(self._scarcity_rank(course), []).append((order, course))
+
+        def remaining_slots(course: Course) -> int:
+            key = demand_class[id(course)]
+            duration = key[2]
+            if self._group_hours.get((course.semester, course.section), 0) + duration > self.max_weekly_hours:
+                return 0
+            used = days_used[id(course)]
+            return sum(count for day, count in feasible[key].items() if day not in used)
+
+        scheduled = {}
+        for rank in sorted(tiers):
+            queued = {id(course): order for order, course in tiers[rank]}
+            current = {}  # id(course) -> slots left recorded by its live heap entry
+
+            def push(course: Course):
+                slots = remaining_slots(course)
+                if current.get(id(course)) != slots:
+                    current[id(course)] = slots
+                    heapq.heappush(heap, (slots, queued[id(course)], course))
+
+            heap = []
+            for order, course in tiers[rank]:
+                push(course)
+            while heap:
+                slots, order, course = heapq.heappop(heap)
+                if id(course) not in queued or current[id(course)] != slots:
+                    continue  # stale: the course is done or was recounted since
+                self._check_stop()
+                current[id(course)] = None
+
+                reasons = {}
+                time_slot = self._next_session_slot(course, days_used[id(course)],
+                                                    rooms_for[demand_class[id(course)]], reasons)
+                pending[id(course)] -= 1
+                if pending[id(course)] == 0:
+                    del queued[id(course)]
+
+                if time_slot is None:
+                    self._record_unscheduled(course, reasons)
+                else:
+                    days_used[id(course)].append(time_slot.day)
+                    self._commit_session(course, time_slot, scheduled)
+
+                    # Recount only the demand classes that the booking can affect
+                    affected = set()
+                    for member in self._lectures.get(id(course), (course,)):
+                        affected |= by_group.get((member.semester, member.section), set())
+                    if course.teacher:
+                        affected |= by_teacher[course.teacher]
+                    day_starts = room_starts[time_slot.day]
+                    for pool in pools_by_room.get(time_slot.room, ()):
+                        any_room = self._pool_starts(time_slot.day, *pool)
+                        if day_starts.get(pool) != any_room:
+                            day_starts[pool] = any_room
+                            affected |= by_pool[pool]
+                    for key in affected:
+                        semester, section, duration = key[:3]
+                        feasible[key][time_slot.day] = self._count_feasible_starts(
+                            time_slot.day, duration, semester, section, rooms_for[key],
+                            self._session_allowed(sample[key], time_slot.day), day_starts)
+                        for member in members[key]:
+                            if id(member) in queued:
+                                push(member)
+
+                if id(course) in queued and current[id(course)] is None:
+                    push(course)
 
     def export_to_json(self, filename: str = "timetable.json"):
         """Export timetable to JSON format"""
@@ -421,6 +1256,19 @@ def create_complex_dataset():
     general_faculty = ["Prof. William Davis", "Dr. Amanda Clark", "Prof. Hassan Mahmoud", "Dr. Emma Thompson",
                        "Prof. Roberto Silva", "Dr. Mei Lin", "Prof. Jean-Pierre Dubois", "Dr. Olga Petrov"]
 
+    # Service theory courses (maths, physics, English, ...) are taught by one
+    # teacher to every section that takes them, as combined lectures
+    service_teachers = {}
+
+    def add_course(course_code, course_name, course_type, credits, semester, section, department,
+                   teacher, own_prefix):
+        combine_key = None
+        if not course_code.startswith(own_prefix) and course_type != CourseType.LAB:
+            combine_key = f"{course_code} {course_name}"
+            teacher = service_teachers.setdefault(combine_key, teacher)
+        generator.add_course(course_code, course_name, course_type, credits,
+                             semester, section, department, teacher, combine_key=combine_key)
+
     # COMPUTER SCIENCE DEPARTMENT - All 8 semesters, 3 sections each
     cs_courses = {
         1: [
@@ -718,40 +1566,40 @@ def create_complex_dataset():
         for section in sections:
             for course_code, course_name, course_type, credits in courses:
                 teacher = random.choice(cs_faculty if course_code.startswith("CS") else general_faculty)
-                generator.add_course(course_code, course_name, course_type, credits,
-                                   semester, section, "Computer Science", teacher)
+                add_course(course_code, course_name, course_type, credits,
+                           semester, section, "Computer Science", teacher, "CS")
 
     # Electrical Engineering - 8 semesters, 2 sections each
     for semester, courses in ee_courses.items():
         for section in ["A", "B"]:
             for course_code, course_name, course_type, credits in courses:
                 teacher = random.choice(ee_faculty if course_code.startswith("EE") else general_faculty)
-                generator.add_course(course_code, course_name, course_type, credits,
-                                   semester, section, "Electrical Engineering", teacher)
+                add_course(course_code, course_name, course_type, credits,
+                           semester, section, "Electrical Engineering", teacher, "EE")
 
     # Mechanical Engineering - 4 semesters, 2 sections each
     for semester, courses in mech_courses.items():
         for section in ["A", "B"]:
             for course_code, course_name, course_type, credits in courses:
                 teacher = random.choice(mech_faculty if course_code.startswith("ME") else general_faculty)
-                generator.add_course(course_code, course_name, course_type, credits,
-                                   semester, section, "Mechanical Engineering", teacher)
+                add_course(course_code, course_name, course_type, credits,
+                           semester, section, "Mechanical Engineering", teacher, "ME")
 
     # Civil Engineering - 6 semesters, 2 sections each
     for semester, courses in civil_courses.items():
         for section in ["A", "B"]:
             for course_code, course_name, course_type, credits in courses:
                 teacher = random.choice(civil_faculty if course_code.startswith("CE") else general_faculty)
-                generator.add_course(course_code, course_name, course_type, credits,
-                                   semester, section, "Civil Engineering", teacher)
+                add_course(course_code, course_name, course_type, credits,
+                           semester, section, "Civil Engineering", teacher, "CE")
 
     # Business Administration - 4 semesters, 3 sections each
     for semester, courses in bus_courses.items():
         for section in sections:
             for course_code, course_name, course_type, credits in courses:
                 teacher = random.choice(general_faculty)  # All business faculty from general pool
-                generator.add_course(course_code, course_name, course_type, credits,
-                                   semester, section, "Business Administration", teacher)
+                add_course(course_code, course_name, course_type, credits,
+                           semester, section, "Business Administration", teacher, "BUS")
 
     return generator
 
@@ -804,21 +1652,24 @@ def run_complex_test():
 
     print(f"Generation completed in {generation_time:.2f} seconds")
     print(f"Total processing time: {total_time:.2f} seconds")
+    cache = generator.slot_cache_stats()
+    print(f"Slot search cache: {cache['hits']} hits, {cache['misses']} misses ({cache['hitRate'] * 100:.1f}% hit rate)")
+    reasons = generator.unscheduled_report()["reasonCounts"]
+    if reasons:
+        print("Unscheduled day attempts by reason: " +
+              ", ".join(f"{reason} {count}" for reason, count in sorted(reasons.items(), key=lambda item: -item[1])))
 
     # Analyze results
-    scheduled_courses = 0
-    total_scheduled_classes = 0
-
-    for key, classes in generator.schedule.items():
-        scheduled_courses += len(classes)
-        for scheduled_class in classes:
-            total_scheduled_classes += len(scheduled_class.time_slots)
-
+    quality = generator.evaluator.summary()
+    scheduled_courses = quality["scheduledCourses"]
     success_rate = (scheduled_courses / total_courses) * 100 if total_courses > 0 else 0
 
     print(f"\nScheduling Results:")
     print(f"- Courses Successfully Scheduled: {scheduled_courses}/{total_courses} ({success_rate:.1f}%)")
-    print(f"- Total Class Sessions Scheduled: {total_scheduled_classes}")
+    print(f"- Total Class Sessions Scheduled: {quality['scheduledSessions']}/{quality['expectedSessions']}")
+    print(f"- Hard Constraint Violations: {quality['hardViolations']}")
+    print(f"- Idle Gap Hours: {quality['idleGapHours']}")
+    print(f"- Room Utilization: {quality['roomUtilization'] * 100:.1f}%")
 
     # Check room utilization
     room_usage = {}
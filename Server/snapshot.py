@@ -0,0 +1,323 @@
+"""
+Compact binary snapshots of a solved timetable.
+
+A snapshot holds a generator's days, time grid, rooms, courses and schedule
+in fixed-width little-endian records that reference one interned string
+table, plus per-day room and group occupancy bitmaps on the time grid.
+Snapshot opens the file with mmap and decodes records only when asked, so a
+large historical timetable can be queried, re-exported or turned back into
+a generator (for warm-starting generate_timetable) without re-parsing JSON
+or re-solving. Calendars and blackouts are solver inputs, not part of the
+result, and are not stored.
+
+Layout (version 1):
+    header        MAGIC, version, section counts, grid (start minute, slot
+                  minutes, slots per day, end minute)
+    days          u32 string ids
+    strings       u32 end offsets, then the UTF-8 blob
+    rooms         ROOM records
+    courses       COURSE records
+    groups        GROUP records, (semester, section) in first-seen order
+    classes       u32 course index per scheduled class
+    entries       ENTRY records: schedule lists in order, one row per class
+    sessions      SESSION records, grouped by class
+    room bitmaps  days x rooms x ceil(slots / 8) bytes
+    group bitmaps days x groups x ceil(slots / 8) bytes
+
+Usage:
+    save_snapshot(generator, "fall.tts")
+    with Snapshot("fall.tts") as snap:
+        snap.export_to_json("fall.json")
+        generator = snap.to_generator()
+"""
+
+import mmap
+import struct
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from server import (UniversityTimetableGenerator, Course, CourseType, Room, RoomType,
+                    ScheduledClass, TimeSlotInfo, _clock_minutes)
+
+MAGIC = b"HHTS"
+FORMAT_VERSION = 1
+
+HEADER = struct.Struct("<4sHHIIIIIIIHHHH")
+ROOM = struct.Struct("<IBxxxI")                # id, type, capacity
+COURSE = struct.Struct("<IIIIIIIIBBH")         # code, name, section, department, teacher,
+                                               # program, combine key, enrolled, type, credits, semester
+GROUP = struct.Struct("<HxxI")                 # semester, section
+ENTRY = struct.Struct("<BxxxII")               # day, group, class
+SESSION = struct.Struct("<IBxHHI")             # class, day, start minute, end minute, room
+U32 = struct.Struct("<I")
+
+NO_STRING = 0xFFFFFFFF
+COURSE_TYPES = list(CourseType)
+ROOM_TYPES = list(RoomType)
+
+
+def _hhmm(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+class _StringTable:
+    def __init__(self):
+        self.ids = {}
+        self.values = []
+
+    def intern(self, value: Optional[str]) -> int:
+        if value is None:
+            return NO_STRING
+        index = self.ids.get(value)
+        if index is None:
+            index = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return index
+
+    def to_bytes(self) -> bytes:
+        blob = bytearray()
+        ends = []
+        for value in self.values:
+            blob += value.encode("utf-8")
+            ends.append(len(blob))
+        return b"".join(U32.pack(end) for end in ends) + bytes(blob)
+
+
+def save_snapshot(generator: UniversityTimetableGenerator, filename: str):
+    """Write the generator's rooms, courses and schedule as a snapshot"""
+    strings = _StringTable()
+    day_ids = [strings.intern(day) for day in generator.days]
+    day_index = {day: i for i, day in enumerate(generator.days)}
+
+    room_index = {}
+    rooms = bytearray()
+    for room in generator.rooms.values():
+        room_index[room.id] = len(room_index)
+        rooms += ROOM.pack(strings.intern(room.id), ROOM_TYPES.index(room.room_type), room.capacity)
+
+    course_index = {}
+    courses = bytearray()
+    for course in generator.courses:
+        course_index[id(course)] = len(course_index)
+        courses += COURSE.pack(
+            strings.intern(course.code), strings.intern(course.name), strings.intern(course.section),
+            strings.intern(course.department), strings.intern(course.teacher),
+            strings.intern(course.program), strings.intern(course.combine_key), course.enrolled_students,
+            COURSE_TYPES.index(course.course_type), course.credit_hours, course.semester)
+
+    group_index = {}
+    groups = bytearray()
+
+    def group_of(semester: int, section: str) -> int:
+        key = (semester, section)
+        if key not in group_index:
+            group_index[key] = len(group_index)
+            groups.extend(GROUP.pack(semester, strings.intern(section)))
+        return group_index[key]
+
+    class_index = {}
+    classes = bytearray()
+    entries = bytearray()
+    sessions = bytearray()
+    session_count = 0
+    for (day, semester, section), scheduled_classes in generator.schedule.items():
+        group = group_of(semester, section)
+        for scheduled_class in scheduled_classes:
+            index = class_index.get(id(scheduled_class))
+            if index is None:
+                index = class_index[id(scheduled_class)] = len(class_index)
+                classes += U32.pack(course_index[id(scheduled_class.course)])
+                for slot in scheduled_class.time_slots:
+                    sessions += SESSION.pack(index, day_index[slot.day], _clock_minutes(slot.start_time),
+                                             _clock_minutes(slot.end_time), room_index[slot.room])
+                    session_count += 1
+            entries += ENTRY.pack(day_index[day], group, index)
+
+    # Occupancy bitmaps on the generator's time grid
+    grid_start = generator.start_time.hour * 60 + generator.start_time.minute
+    grid_slots = generator._slot_index(generator.end_time)
+    width = (grid_slots + 7) // 8
+    room_bits = [0] * (len(generator.days) * len(room_index))
+    group_bits = [0] * (len(generator.days) * len(group_index))
+    seen = set()
+    for scheduled_classes in generator.schedule.values():
+        for scheduled_class in scheduled_classes:
+            if id(scheduled_class) in seen:
+                continue
+            seen.add(id(scheduled_class))
+            course = scheduled_class.course
+            for slot in scheduled_class.time_slots:
+                first = (_clock_minutes(slot.start_time) - grid_start) // generator.slot_minutes
+                last = -((grid_start - _clock_minutes(slot.end_time)) // generator.slot_minutes)
+                mask = ((1 << (last - first)) - 1) << first
+                day = day_index[slot.day]
+                room_bits[day * len(room_index) + room_index[slot.room]] |= mask
+                group_bits[day * len(group_index) + group_of(course.semester, course.section)] |= mask
+    bitmaps = b"".join(bits.to_bytes(width, "little") for bits in room_bits + group_bits)
+
+    header = HEADER.pack(
+        MAGIC, FORMAT_VERSION, len(day_ids), len(strings.values), len(room_index), len(course_index),
+        len(group_index), len(class_index), len(entries) // ENTRY.size, session_count,
+        grid_start, generator.slot_minutes, grid_slots,
+        generator.end_time.hour * 60 + generator.end_time.minute)
+    with open(filename, "wb") as f:
+        f.write(header)
+        f.write(b"".join(U32.pack(i) for i in day_ids))
+        f.write(strings.to_bytes())
+        for block in (rooms, courses, groups, classes, entries, sessions):
+            f.write(block)
+        f.write(bitmaps)
+
+
+class Snapshot:
+    """Read-only, memory-mapped view of a snapshot file"""
+
+    def __init__(self, filename: str):
+        with open(filename, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, n_days, n_strings, self.room_count, self.course_count, self.group_count,
+         self.class_count, self.entry_count, self.session_count,
+         grid_start, self.slot_minutes, self.grid_slots, grid_end) = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{filename} is not a timetable snapshot")
+        if version != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"Unsupported snapshot version {version} (expected {FORMAT_VERSION})")
+        self.grid_start = _hhmm(grid_start)
+        self.grid_end = _hhmm(grid_end)
+
+        offset = HEADER.size
+        day_offset, offset = offset, offset + 4 * n_days
+        self._string_ends, offset = offset, offset + 4 * n_strings
+        self._string_blob = offset
+        offset += U32.unpack_from(self._map, self._string_ends + 4 * (n_strings - 1))[0] if n_strings else 0
+        self._sections = {}
+        for name, record, count in (("rooms", ROOM, self.room_count),
+                                    ("courses", COURSE, self.course_count),
+                                    ("groups", GROUP, self.group_count), ("classes", U32, self.class_count),
+                                    ("entries", ENTRY, self.entry_count), ("sessions", SESSION, self.session_count)):
+            self._sections[name] = offset
+            offset += record.size * count
+        self._bitmap_width = (self.grid_slots + 7) // 8
+        self._room_bitmaps = offset
+        self._group_bitmaps = offset + n_days * self.room_count * self._bitmap_width
+
+        self._strings = {}
+        self.days = [self.string(U32.unpack_from(self._map, day_offset + 4 * i)[0]) for i in range(n_days)]
+        self._room_ids = {self.room(i).id: i for i in range(self.room_count)}
+        self._group_ids = {self.group(i): i for i in range(self.group_count)}
+
+    def close(self):
+        self._map.close()
+
+    def __enter__(self) -> "Snapshot":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- record access -------------------------------------------------------
+
+    def string(self, index: int) -> Optional[str]:
+        if index == NO_STRING:
+            return None
+        value = self._strings.get(index)
+        if value is None:
+            start = U32.unpack_from(self._map, self._string_ends + 4 * (index - 1))[0] if index else 0
+            end = U32.unpack_from(self._map, self._string_ends + 4 * index)[0]
+            value = self._strings[index] = self._map[self._string_blob + start:self._string_blob + end].decode("utf-8")
+        return value
+
+    def _record(self, section: str, record: struct.Struct, index: int) -> Tuple:
+        return record.unpack_from(self._map, self._sections[section] + record.size * index)
+
+    def room(self, index: int) -> Room:
+        room_id, room_type, capacity = self._record("rooms", ROOM, index)
+        return Room(self.string(room_id), ROOM_TYPES[room_type], capacity)
+
+    def course(self, index: int) -> Course:
+        (code, name, section, department, teacher, program, combine_key, enrolled,
+         course_type, credits, semester) = self._record("courses", COURSE, index)
+        return Course(code=self.string(code), name=self.string(name), course_type=COURSE_TYPES[course_type],
+                      credit_hours=credits, semester=semester, section=self.string(section),
+                      department=self.string(department), teacher=self.string(teacher),
+                      enrolled_students=enrolled, program=self.string(program),
+                      combine_key=self.string(combine_key))
+
+    def group(self, index: int) -> Tuple[int, str]:
+        semester, section = self._record("groups", GROUP, index)
+        return semester, self.string(section)
+
+    def session(self, index: int) -> Tuple[int, str, str, str, str]:
+        """(course index, day, start "HH:MM", end "HH:MM", room id) of one session"""
+        class_index, day, start, end, room = self._record("sessions", SESSION, index)
+        course_index = self._record("classes", U32, class_index)[0]
+        return course_index, self.days[day], _hhmm(start), _hhmm(end), self.room(room).id
+
+    def sessions(self) -> Iterator[Tuple[int, str, str, str, str]]:
+        for index in range(self.session_count):
+            yield self.session(index)
+
+    # --- occupancy queries ---------------------------------------------------
+
+    def _bitmap(self, base: int, row: int) -> int:
+        start = base + row * self._bitmap_width
+        return int.from_bytes(self._map[start:start + self._bitmap_width], "little")
+
+    def _window_mask(self, start: str, end: str) -> int:
+        grid_start = _clock_minutes(self.grid_start)
+        first = max(0, (_clock_minutes(start) - grid_start) // self.slot_minutes)
+        last = min(self.grid_slots, -((grid_start - _clock_minutes(end)) // self.slot_minutes))
+        return ((1 << (last - first)) - 1) << first if last > first else 0
+
+    def room_busy(self, day: str, room_id: str, start: str, end: str) -> bool:
+        """Whether any session holds room_id between start and end on day"""
+        row = self.days.index(day) * self.room_count + self._room_ids[room_id]
+        return bool(self._bitmap(self._room_bitmaps, row) & self._window_mask(start, end))
+
+    def group_busy(self, day: str, semester: int, section: str, start: str, end: str) -> bool:
+        """Whether the (semester, section) group has class between start and end on day"""
+        group = self._group_ids.get((semester, section))
+        if group is None:
+            return False
+        row = self.days.index(day) * self.group_count + group
+        return bool(self._bitmap(self._group_bitmaps, row) & self._window_mask(start, end))
+
+    # --- rebuilding ----------------------------------------------------------
+
+    def to_generator(self) -> UniversityTimetableGenerator:
+        """Generator with the snapshot's rooms, courses and schedule
+
+        Solving it again keeps every stored session and only places missing ones.
+        """
+        generator = UniversityTimetableGenerator()
+        generator.days = list(self.days)
+        generator.rooms = {}
+        for index in range(self.room_count):
+            room = self.room(index)
+            generator.add_custom_room(room.id, room.room_type, room.capacity)
+        for index in range(self.course_count):
+            generator.courses.append(self.course(index))
+
+        generator.configure_time_grid(self.grid_start, self.grid_end, self.slot_minutes)
+
+        classes: List[ScheduledClass] = []
+        for index in range(self.class_count):
+            course = generator.courses[self._record("classes", U32, index)[0]]
+            classes.append(ScheduledClass(course=course, time_slots=[]))
+        for index in range(self.session_count):
+            class_index, day, start, end, room = self._record("sessions", SESSION, index)
+            classes[class_index].time_slots.append(TimeSlotInfo(
+                day=self.days[day], start_time=_hhmm(start), end_time=_hhmm(end), room=self.room(room).id))
+
+        schedule: Dict[Tuple[str, int, str], List[ScheduledClass]] = {}
+        for index in range(self.entry_count):
+            day, group, class_index = self._record("entries", ENTRY, index)
+            semester, section = self.group(group)
+            schedule.setdefault((self.days[day], semester, section), []).append(classes[class_index])
+        generator.schedule = schedule
+        return generator
+
+    def export_to_json(self, filename: str = "timetable.json"):
+        """Same output as UniversityTimetableGenerator.export_to_json on the saved generator"""
+        self.to_generator().export_to_json(filename)
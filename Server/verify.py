@@ -0,0 +1,513 @@
+"""
+Schedule validation and differential testing of the solver engines.
+
+validate_schedule() checks any schedule produced by a
+UniversityTimetableGenerator in a single pass over its sessions:
+- no room, group or teacher overlaps, and nothing inside a blackout window;
+  members of one combined lecture share a single session
+- every session on a working day and inside the course's calendar
+  (department hours or the MORNING/EVENING window)
+- no group above the weekly hour cap
+- labs in lab rooms, theory in classrooms, rooms large enough
+- each course has _get_classes_per_week sessions of the right length, on
+  distinct days
+
+run_differential() builds seeded random catalogs, solves each with every
+engine in ENGINES and compares validity and success rate against the
+reference greedy (group ordering, no memo). Engines that only change how
+fast the same decisions are made must also produce the identical schedule.
+
+check_snapshot_roundtrip() saves a solved random catalog as a snapshot,
+reopens it through mmap and checks that its JSON export, occupancy bitmaps
+and rebuilt generator all match the original.
+
+check_evaluator_consistency() applies random add/remove/move edits to a
+solved catalog's running ScheduleEvaluator and compares it with one built
+from scratch over the resulting sessions.
+
+Usage:
+    python verify.py --seeds 50 --groups 12
+    python verify.py --seeds 50 --snapshots
+    python verify.py --seeds 50 --evaluator
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from evaluator import ScheduleEvaluator
+from server import UniversityTimetableGenerator, CourseType, RoomType, ScheduledClass, TimeSlotInfo
+from snapshot import Snapshot, save_snapshot
+
+
+def _minutes(hhmm: str) -> int:
+    hours, minutes = hhmm.split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+@dataclass
+class ValidationReport:
+    sessions: int = 0
+    courses: int = 0
+    complete_courses: int = 0
+    violations: List[Dict] = field(default_factory=list)
+
+    @property
+    def valid(self) -> bool:
+        return not self.violations
+
+    @property
+    def success_rate(self) -> float:
+        return self.complete_courses / self.courses if self.courses else 1.0
+
+    def counts(self) -> Dict[str, int]:
+        totals = {}
+        for violation in self.violations:
+            totals[violation["kind"]] = totals.get(violation["kind"], 0) + 1
+        return totals
+
+    def add(self, kind: str, detail: str):
+        self.violations.append({"kind": kind, "detail": detail})
+
+
+def _minute_mask(start: int, end: int) -> int:
+    return ((1 << (end - start)) - 1) << start if end > start else 0
+
+
+def _calendar_minutes(generator: UniversityTimetableGenerator, course, day: str) -> int:
+    """Minute bits of day the course may use, worked out from generator.calendars
+
+    Deliberately independent of the solver's compiled masks: a program
+    calendar's empty days or hours come from the department calendar, and
+    without hours the semester's MORNING (1-4) or EVENING window applies,
+    always within the day's time grid.
+    """
+    program = generator.calendars.get((course.department, course.program))
+    department = generator.calendars.get((course.department, None))
+    days = (program.days if program else ()) or (department.days if department else ())
+    hours = (program.hours if program else ()) or (department.hours if department else ())
+    if days and day not in days:
+        return 0
+
+    if hours:
+        allowed = 0
+        for start, end in hours:
+            allowed |= _minute_mask(_minutes(start), _minutes(end))
+    elif course.semester <= 4:
+        allowed = _minute_mask(_minutes(f"{generator.start_time:%H:%M}"), _minutes(f"{generator.junior_end:%H:%M}"))
+    else:
+        allowed = _minute_mask(_minutes(f"{generator.senior_start:%H:%M}"), _minutes(f"{generator.end_time:%H:%M}"))
+    return allowed & _minute_mask(_minutes(f"{generator.start_time:%H:%M}"), _minutes(f"{generator.end_time:%H:%M}"))
+
+
+def validate_schedule(generator: UniversityTimetableGenerator, check_teachers: bool = True) -> ValidationReport:
+    """Check every hard constraint; linear in the number of scheduled sessions
+
+    Occupancy is tracked as one bit per minute of the day per (day, resource),
+    so each overlap test is a single AND on a fixed-width integer.
+    """
+    report = ValidationReport(courses=len(generator.courses))
+    busy = {}
+    group_minutes = {}
+    slots_by_course = {}
+    held = set()  # (day, kind, resource, start, end, tag) of combined lecture sessions
+    seats = {}    # (day, room, start, end, tag) -> combined enrollment
+
+    seen = set()
+    for key, classes in generator.schedule.items():
+        for scheduled_class in classes:
+            if id(scheduled_class) in seen:
+                continue
+            seen.add(id(scheduled_class))
+            course = scheduled_class.course
+            slots_by_course.setdefault(id(course), (course, []))[1].extend(scheduled_class.time_slots)
+
+    for course, slots in slots_by_course.values():
+        label = f"{course.code} (semester {course.semester}, section {course.section})"
+        group = (course.semester, course.section)
+        tag = generator._lecture_tag(course)
+        expected_minutes = int(generator._get_class_duration(course.course_type) * 60)
+        expected_sessions = generator._get_classes_per_week(course.course_type)
+
+        if len(slots) == expected_sessions:
+            report.complete_courses += 1
+        elif len(slots) > expected_sessions:
+            report.add("session_count", f"{label}: {len(slots)} sessions, expected {expected_sessions}")
+        if len({slot.day for slot in slots}) != len(slots):
+            report.add("same_day_sessions", f"{label}: more than one session on a day")
+
+        for slot in slots:
+            report.sessions += 1
+            start, end = _minutes(slot.start_time), _minutes(slot.end_time)
+            where = f"{label} {slot.day} {slot.start_time}-{slot.end_time} in {slot.room}"
+
+            if slot.day not in generator.days:
+                report.add("working_day", f"{where}: not a working day")
+            if end - start != expected_minutes:
+                report.add("duration", f"{where}: lasts {end - start} minutes, expected {expected_minutes}")
+            if _minute_mask(start, end) & ~_calendar_minutes(generator, course, slot.day):
+                report.add("window", f"{where}: outside the course's calendar")
+            resources = [("room", slot.room), ("group", group)]
+            if course.teacher:
+                resources.append(("teacher", course.teacher))
+            for kind, resource in resources:
+                if any(start < e and s < end for s, e in generator._blackout_intervals(kind, resource, slot.day)):
+                    report.add("blackout", f"{where}: {kind} {resource} is blacked out")
+
+            room = generator.rooms.get(slot.room)
+            if room is None:
+                report.add("unknown_room", f"{where}: room does not exist")
+            else:
+                if room.room_type != generator._get_room_type(course):
+                    report.add("room_type", f"{where}: {room.room_type.value} room")
+                if tag is None and room.capacity < course.enrolled_students:
+                    report.add("capacity", f"{where}: {room.capacity} seats for {course.enrolled_students} students")
+                elif tag is not None:
+                    seats_key = (slot.day, slot.room, start, end, tag)
+                    seats[seats_key] = seats.get(seats_key, 0) + course.enrolled_students
+
+            # A combined lecture's session occupies each resource only once
+            mask = ((1 << (end - start)) - 1) << start
+            resources = [("room", slot.room), ("group", group)]
+            if check_teachers and course.teacher:
+                resources.append(("teacher", course.teacher))
+            new_group = True
+            for kind, resource in resources:
+                if tag is not None:
+                    shared = (slot.day, kind, resource, start, end, tag)
+                    if shared in held:
+                        new_group = new_group and kind != "group"
+                        continue
+                    held.add(shared)
+                key = (slot.day, kind, resource)
+                if busy.get(key, 0) & mask:
+                    report.add(f"{kind}_overlap", f"{where}: {kind} {resource} already busy")
+                busy[key] = busy.get(key, 0) | mask
+
+            if new_group:
+                group_minutes[group] = group_minutes.get(group, 0) + (end - start)
+
+    for (day, room_id, start, end, _), enrolled in seats.items():
+        room = generator.rooms[room_id]
+        if room.capacity < enrolled:
+            report.add("capacity", f"combined lecture {day} {start // 60:02d}:{start % 60:02d} in {room_id}: "
+                                   f"{room.capacity} seats for {enrolled} students")
+
+    for (semester, section), minutes in group_minutes.items():
+        if minutes > generator.max_weekly_hours * 60:
+            report.add("weekly_cap", f"semester {semester} section {section}: {minutes / 60:g} hours")
+
+    return report
+
+
+SECTIONS = "ABCD"
+MAX_GROUPS = 8 * len(SECTIONS)  # semesters 1-8 x sections
+DEPARTMENTS = ("CS", "EE", "BBA")
+HOUR_RANGES = ([("08:00", "13:00")], [("09:00", "12:00"), ("13:00", "17:00")],
+               [("11:00", "18:00")], [("14:00", "21:00")])
+
+
+def random_catalog(seed: int, groups: int = 8, rooms: int = 10, labs: int = 4,
+                   teachers: int = 12) -> UniversityTimetableGenerator:
+    """Seeded random catalog of rooms, groups, courses and combined lectures
+
+    Catalogs may also use a finer or shorter time grid, department and
+    program calendars (a program calendar with only days or only hours
+    inherits the rest from its department) and room, teacher and group
+    blackouts.
+    """
+    if not 1 <= groups <= MAX_GROUPS:
+        raise ValueError(f"groups must be between 1 and {MAX_GROUPS}")
+    rng = random.Random(seed)
+    generator = UniversityTimetableGenerator()
+    generator.rooms = {}
+    for i in range(rooms):
+        generator.add_custom_room(f"R{i + 1}", RoomType.CLASSROOM, rng.choice([30, 40, 50, 60, 80, 150]))
+    for i in range(labs):
+        generator.add_custom_room(f"LAB{i + 1}", RoomType.LAB, rng.choice([25, 30, 35, 40]))
+    if rng.random() < 0.3:
+        generator.days = generator.days + ["Saturday"]
+    if rng.random() < 0.3:
+        generator.configure_time_grid(rng.choice(["07:30", "08:00"]), rng.choice(["20:00", "21:30"]),
+                                      rng.choice([15, 30]))
+
+    for department in DEPARTMENTS:
+        if rng.random() < 0.4:
+            days = sorted(rng.sample(generator.days, rng.randint(3, len(generator.days))),
+                          key=generator.days.index)
+            generator.set_calendar(department, days=days, hours=rng.choice(HOUR_RANGES + ([],)))
+        if rng.random() < 0.3:
+            if rng.random() < 0.5:
+                generator.set_calendar(department, days=rng.sample(generator.days, 4), program=f"{department} BS")
+            else:
+                generator.set_calendar(department, hours=rng.choice(HOUR_RANGES), program=f"{department} BS")
+
+    faculty = [f"Teacher {i + 1}" for i in range(teachers)]
+    used_groups = set()
+    while len(used_groups) < groups:
+        used_groups.add((rng.randint(1, 8), rng.choice(SECTIONS)))
+
+    for semester, section in sorted(used_groups):
+        enrollment = rng.randint(20, 70)
+        department = rng.choice(DEPARTMENTS)
+        program = f"{department} {rng.choice(['BS', 'MS'])}"
+        for i in range(rng.randint(3, 7)):
+            course_type = rng.choice([CourseType.THEORY_3CR, CourseType.THEORY_3CR,
+                                      CourseType.THEORY_2CR, CourseType.LAB])
+            credits = {CourseType.THEORY_3CR: 3, CourseType.THEORY_2CR: 2, CourseType.LAB: 1}[course_type]
+            generator.add_course(
+                code=f"C{semester}{section}{i}", name=f"Course {semester}{section}{i}",
+                course_type=course_type, credit_hours=credits, semester=semester, section=section,
+                department=department, teacher=rng.choice(faculty), enrolled_students=enrollment,
+                program=program,
+            )
+
+    # A few service courses taught as one combined lecture to several groups
+    for i in range(rng.randint(0, 2)):
+        teacher = rng.choice(faculty)
+        for semester, section in rng.sample(sorted(used_groups), min(len(used_groups), rng.randint(2, 4))):
+            generator.add_course(
+                code=f"SVC{i}", name=f"Service Course {i}", course_type=CourseType.THEORY_3CR,
+                credit_hours=3, semester=semester, section=section, department="Service",
+                teacher=teacher, enrolled_students=rng.randint(20, 50), combine_key=f"SVC{i}",
+            )
+
+    # Blackouts on each kind of resource
+    targets = ([("room", room) for room in generator.rooms] + [("teacher", teacher) for teacher in faculty]
+               + [("group", group) for group in sorted(used_groups)])
+    for _ in range(rng.randint(0, 6)):
+        kind, target = rng.choice(targets)
+        start = rng.randrange(8, 19)
+        generator.add_blackout(kind, target, rng.choice(generator.days),
+                               f"{start:02d}:{rng.choice(['00', '30'])}", f"{start + rng.randint(1, 3):02d}:00")
+    return generator
+
+
+def _solve(ordering: str, memoize: bool) -> Callable[[UniversityTimetableGenerator], None]:
+    def solve(generator: UniversityTimetableGenerator):
+        generator.memoize_slot_search = memoize
+        generator.generate_timetable(ordering=ordering)
+    return solve
+
+
+def _solve_on_fork(generator: UniversityTimetableGenerator):
+    fork = generator.fork()
+    fork.generate_timetable()
+    fork.commit()
+
+
+# name -> (solve function, must match the reference schedule exactly)
+REFERENCE = "group"
+ENGINES = {
+    "group": (_solve("group", memoize=False), True),
+    "group+memo": (_solve("group", memoize=True), True),
+    "group+fork": (_solve_on_fork, True),
+    "global": (_solve("global", memoize=False), False),
+    "global+memo": (_solve("global", memoize=True), False),
+}
+
+
+def _fingerprint(generator: UniversityTimetableGenerator) -> List:
+    return sorted(
+        (sc.course.code, sc.course.semester, sc.course.section, slot.day, slot.start_time, slot.room)
+        for classes in generator.schedule.values() for sc in classes for slot in sc.time_slots
+    )
+
+
+def run_differential(seeds: List[int], engines: Optional[Dict] = None,
+                     catalog: Callable[[int], UniversityTimetableGenerator] = random_catalog,
+                     check_teachers: bool = True) -> Dict:
+    """Solve each seeded catalog with every engine and report divergences"""
+    engines = engines or ENGINES
+    reference_solve = ENGINES[REFERENCE][0]
+    divergences = []
+    totals = {name: {"valid": 0, "complete": 0, "courses": 0, "violations": 0} for name in engines}
+
+    for seed in seeds:
+        reference = catalog(seed)
+        with contextlib.redirect_stdout(io.StringIO()):
+            reference_solve(reference)
+        reference_report = validate_schedule(reference, check_teachers)
+        reference_print = _fingerprint(reference)
+
+        for name, (solve, exact) in engines.items():
+            generator = catalog(seed)
+            with contextlib.redirect_stdout(io.StringIO()):
+                solve(generator)
+            report = validate_schedule(generator, check_teachers)
+
+            totals[name]["valid"] += int(report.valid)
+            totals[name]["violations"] += len(report.violations)
+            totals[name]["complete"] += report.complete_courses
+            totals[name]["courses"] += report.courses
+
+            problems = []
+            if report.valid != reference_report.valid:
+                problems.append(f"validity {reference_report.valid} -> {report.valid} {report.counts()}")
+            elif len(report.violations) > len(reference_report.violations):
+                problems.append(f"violations {reference_report.counts()} -> {report.counts()}")
+            if report.success_rate < reference_report.success_rate:
+                problems.append(f"success rate {reference_report.success_rate:.3f} -> {report.success_rate:.3f}")
+            if exact and _fingerprint(generator) != reference_print:
+                problems.append("schedule differs from reference")
+            if problems:
+                divergences.append({"seed": seed, "engine": name, "problems": problems})
+
+    return {"seeds": len(seeds), "totals": totals, "divergences": divergences}
+
+
+def check_snapshot_roundtrip(seed: int, groups: int = 8) -> List[str]:
+    """Problems found saving and reloading one solved random catalog as a snapshot"""
+    generator = random_catalog(seed, groups=groups)
+    with contextlib.redirect_stdout(io.StringIO()):
+        generator.generate_timetable()
+
+    problems = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "timetable.tts")
+        save_snapshot(generator, path)
+        generator.export_to_json(os.path.join(tmp, "expected.json"))
+        with Snapshot(path) as snapshot:
+            snapshot.export_to_json(os.path.join(tmp, "actual.json"))
+            for _, day, start, end, room in snapshot.sessions():
+                if not snapshot.room_busy(day, room, start, end):
+                    problems.append(f"room bitmap misses {room} {day} {start}-{end}")
+            for (day, semester, section), classes in generator.schedule.items():
+                for scheduled_class in classes:
+                    for slot in scheduled_class.time_slots:
+                        if slot.day == day and not snapshot.group_busy(day, semester, section,
+                                                                       slot.start_time, slot.end_time):
+                            problems.append(f"group bitmap misses {semester}{section} {day} {slot.start_time}")
+            rebuilt = snapshot.to_generator()
+        with open(os.path.join(tmp, "expected.json")) as f:
+            expected = f.read()
+        with open(os.path.join(tmp, "actual.json")) as f:
+            if f.read() != expected:
+                problems.append("JSON export differs")
+
+    if _fingerprint(rebuilt) != _fingerprint(generator):
+        problems.append("rebuilt schedule differs")
+    # Calendars and blackouts are solver inputs, not stored in snapshots
+    rebuilt.calendars = dict(generator.calendars)
+    for blackout in generator.blackouts:
+        rebuilt.add_blackout(blackout.kind, blackout.target, blackout.day, blackout.start_time, blackout.end_time)
+    before, after = validate_schedule(generator), validate_schedule(rebuilt)
+    if after.counts() != before.counts() or after.complete_courses != before.complete_courses:
+        problems.append(f"validation {before.counts()} -> {after.counts()}")
+    return problems
+
+
+def check_evaluator_consistency(seed: int, groups: int = 8, steps: int = 300) -> List[str]:
+    """Problems found comparing the running evaluator with a fresh one after random edits"""
+    rng = random.Random(seed)
+    generator = random_catalog(seed, groups=groups)
+    with contextlib.redirect_stdout(io.StringIO()):
+        generator.generate_timetable()
+    evaluator = generator.evaluator
+
+    placed, removed = [], []
+    seen = set()
+    for classes in generator.schedule.values():
+        for scheduled_class in classes:
+            if id(scheduled_class) not in seen:
+                seen.add(id(scheduled_class))
+                placed.extend((scheduled_class.course, slot) for slot in scheduled_class.time_slots)
+
+    grid_start = _minutes(generator.start_time.strftime("%H:%M"))
+    grid_end = _minutes(generator.end_time.strftime("%H:%M"))
+    rooms = sorted(generator.rooms)
+
+    def random_slot(slot: TimeSlotInfo) -> TimeSlotInfo:
+        length = _minutes(slot.end_time) - _minutes(slot.start_time)
+        start = grid_start + generator.slot_minutes * rng.randrange(
+            (grid_end - grid_start - length) // generator.slot_minutes + 1)
+        return TimeSlotInfo(day=rng.choice(generator.days), start_time=f"{start // 60:02d}:{start % 60:02d}",
+                            end_time=f"{(start + length) // 60:02d}:{(start + length) % 60:02d}",
+                            room=rng.choice(rooms))
+
+    for _ in range(steps):
+        action = rng.random()
+        if placed and action < 0.5:
+            index = rng.randrange(len(placed))
+            course, slot = placed[index]
+            placed[index] = (course, random_slot(slot))
+            evaluator.move_session(course, slot, placed[index][1])
+        elif placed and action < 0.75:
+            course, slot = placed.pop(rng.randrange(len(placed)))
+            evaluator.remove_session(course, slot)
+            removed.append((course, slot))
+        elif removed:
+            course, slot = removed.pop(rng.randrange(len(removed)))
+            evaluator.add_session(course, slot)
+            placed.append((course, slot))
+
+    rebuilt = generator.fork()
+    rebuilt.discard()
+    rebuilt.schedule = {}
+    for course, slot in placed:
+        rebuilt.schedule.setdefault((slot.day, course.semester, course.section), []).append(
+            ScheduledClass(course=course, time_slots=[slot]))
+    fresh = ScheduleEvaluator(rebuilt)
+
+    problems = []
+    for name in ("violations", "scheduled_sessions", "unscheduled_sessions", "scheduled_courses",
+                 "idle_minutes", "booked_room_minutes"):
+        if getattr(evaluator, name) != getattr(fresh, name):
+            problems.append(f"{name} {getattr(fresh, name)} -> {getattr(evaluator, name)}")
+    for name in ("day_balance", "teacher_load_spread"):
+        if abs(getattr(evaluator, name) - getattr(fresh, name)) > 1e-6:
+            problems.append(f"{name} {getattr(fresh, name):.4f} -> {getattr(evaluator, name):.4f}")
+    return problems
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Validate solver engines against the reference greedy")
+    parser.add_argument("--seeds", type=int, default=25, help="number of random catalogs")
+    parser.add_argument("--first-seed", type=int, default=0)
+    parser.add_argument("--groups", type=int, default=8, help="groups per catalog")
+    parser.add_argument("--skip-teacher-check", action="store_true",
+                        help="do not treat teacher double-booking as a violation")
+    parser.add_argument("--snapshots", action="store_true",
+                        help="check snapshot save/load round trips instead of comparing engines")
+    parser.add_argument("--evaluator", action="store_true",
+                        help="check the incremental evaluator against a fresh one after random edits")
+    args = parser.parse_args(argv)
+    if not 1 <= args.groups <= MAX_GROUPS:
+        parser.error(f"--groups must be between 1 and {MAX_GROUPS}")
+
+    seeds = list(range(args.first_seed, args.first_seed + args.seeds))
+    for enabled, check, label in ((args.snapshots, check_snapshot_roundtrip, "snapshot round trip(s)"),
+                                  (args.evaluator, check_evaluator_consistency, "evaluator replay(s)")):
+        if not enabled:
+            continue
+        failures = 0
+        for seed in seeds:
+            problems = check(seed, groups=args.groups)
+            if problems:
+                failures += 1
+                print(f"seed {seed}: {'; '.join(problems)}")
+        print(f"{len(seeds) - failures}/{len(seeds)} {label} ok")
+        return 1 if failures else 0
+
+    result = run_differential(seeds, catalog=lambda seed: random_catalog(seed, groups=args.groups),
+                              check_teachers=not args.skip_teacher_check)
+
+    print(f"{'Engine':14} {'Valid':>8} {'Success %':>10} {'Violations':>11}")
+    for name, total in result["totals"].items():
+        rate = 100.0 * total["complete"] / total["courses"] if total["courses"] else 100.0
+        print(f"{name:14} {total['valid']:>4}/{result['seeds']:<3} {rate:>10.1f} {total['violations']:>11}")
+
+    for divergence in result["divergences"]:
+        print(f"seed {divergence['seed']} {divergence['engine']}: {'; '.join(divergence['problems'])}")
+    print(f"\n{len(result['divergences'])} divergence(s)")
+    return 1 if result["divergences"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())